@@ -3,6 +3,8 @@
 """
 import streamlit as st
 from typing import Dict, Tuple
+from text_index import get_text_index
+from omniparser_analyzer import get_spatial_index
 
 
 class AdvancedUIController:
@@ -49,6 +51,29 @@ class AdvancedUIController:
             else:
                 st.warning("분석 데이터 없음")
     
+    @staticmethod
+    def get_click_target(analysis: Dict, x: int, y: int, max_distance: float = 0) -> Dict or None:
+        """
+        클릭 좌표가 가리키는 요소 확인
+        
+        Args:
+            analysis: 화면 분석 결과
+            x, y: 클릭 좌표
+            max_distance: 좌표 아래 요소가 없을 때 허용할 가장 가까운 요소까지의 거리 (픽셀)
+            
+        Returns:
+            좌표 아래의 가장 작은 요소, 없으면 max_distance 안의 가장 가까운 요소, 또는 None
+        """
+        if not analysis or not analysis.get('elements'):
+            return None
+        
+        index = get_spatial_index(analysis)
+        hits = index.query_point(x, y)
+        if len(hits):
+            return analysis['elements'][int(hits[0])]
+        nearest = index.nearest(x, y, 1, max_distance) if max_distance > 0 else []
+        return analysis['elements'][nearest[0][0]] if nearest else None
+    
     @staticmethod
     def get_action_command(analysis: Dict, user_intent: str) -> str or None:
         """
@@ -74,11 +99,11 @@ class AdvancedUIController:
         
         target_labels = intent_map.get(user_intent, [])
         
-        for element in analysis.get('elements', []):
-            label = element.get('label', '').lower()
-            if any(target in label for target in target_labels):
-                cx, cy = element.get('center', (0, 0))
-                return f"CLICK:{cx},{cy}"
+        # 분석 결과당 한 번 만든 라벨 색인으로 조회 (요소 순서상 첫 일치)
+        matches = get_text_index(analysis, 'elements').search_any(target_labels)
+        if matches:
+            cx, cy = analysis['elements'][matches[0]]['center']
+            return f"CLICK:{cx},{cy}"
         
         return None
 
@@ -87,30 +112,64 @@ class SmartCommandBuilder:
     """자동 명령 빌더"""
     
     @staticmethod
-    def build_workflow_command(steps: list) -> str:
+    def build_workflow_command(steps: list, analysis: Dict = None) -> str:
         """
         여러 스텝을 하나의 워크플로우로 변환
         
+        receiver.py가 한 번의 요청으로 전체 스텝을 실행하고 스텝별 상태를 돌려줍니다.
+        
         Args:
-            steps: [{"action": "click", "target": "신청"}, ...]
+            steps: [{"action": "click", "target": "신청"}, {"action": "click", "x": 10, "y": 20}, ...]
+                x/y 클릭에 "snap": 픽셀(또는 True)을 주면 analysis의 가장 가까운 요소 중심으로 보정
+            analysis: 화면 분석 결과 (target 라벨을 좌표로 바꿀 때 사용)
             
         Returns:
-            워크플로우 명령어
+            워크플로우 명령어 ("WORKFLOW:CLICK:x,y;TYPE:...;WAIT:1")
+        
+        Raises:
+            ValueError: 클릭 스텝의 좌표를 정할 수 없을 때 (리시버는 라벨 클릭을 실행할 수 없음)
         """
         commands = []
         for step in steps:
             action = step.get('action')
             
             if action == 'click':
-                commands.append(f"CLICK:{step.get('target')}")
+                point = SmartCommandBuilder._resolve_click_point(step, analysis)
+                if point is None:
+                    raise ValueError(f"클릭 대상을 찾을 수 없습니다: {step.get('target')!r}")
+                commands.append(f"CLICK:{point[0]},{point[1]}")
             elif action == 'type':
-                commands.append(f"TYPE:{step.get('text')}")
+                # ';'는 스텝 구분자이므로 이스케이프
+                commands.append(f"TYPE:{step.get('text')}".replace(";", "\\;"))
             elif action == 'wait':
                 commands.append(f"WAIT:{step.get('duration', 1)}")
             elif action == 'screenshot':
                 commands.append("SCREENSHOT")
         
-        return ";".join(commands)
+        return "WORKFLOW:" + ";".join(commands)
+    
+    @staticmethod
+    def _resolve_click_point(step: Dict, analysis: Dict = None) -> Tuple[int, int] or None:
+        """스텝의 클릭 좌표 (x/y, center, 또는 analysis에서 target 라벨 검색)"""
+        if 'x' in step and 'y' in step:
+            x, y = int(step['x']), int(step['y'])
+            if analysis and step.get('snap'):
+                # 좌표 근처 요소의 중심으로 보정 (snap: 허용 거리 픽셀, True면 제한 없음)
+                limit = float('inf') if step['snap'] is True else float(step['snap'])
+                element = AdvancedUIController.get_click_target(analysis, x, y, limit)
+                if element is not None:
+                    return tuple(element['center'])
+            return x, y
+        if 'center' in step:
+            return tuple(step['center'])
+        
+        target = str(step.get('target', ''))
+        if analysis and target:
+            # get_action_command와 같은 라벨 색인 (요소 순서상 첫 일치)
+            matches = get_text_index(analysis, 'elements').search(target)
+            if matches:
+                return tuple(analysis['elements'][matches[0]]['center'])
+        return None
 
 
 if __name__ == "__main__":
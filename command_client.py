@@ -0,0 +1,314 @@
+"""
+receiver.py와 통신하는 영구 명령 채널 클라이언트
+
+프로토콜 (한 줄 = 한 메시지, UTF-8, '\\n' 구분):
+    요청: "<seq>|<COMMAND>"      예) "12|MOVE:100,200"
+    응답: "<seq>|OK[:메시지]"    또는 "<seq>|ERR:<메시지>"
+    진행: "<seq>|STEP:<번호>:<OK|ERR>:<ms>:<명령>"  (워크플로우 단계별, 최종 응답 전)
+    바이너리: "<seq>|DATA:<바이트 수>:<헤더>" 줄 바로 뒤에 본문 (SCREENSHOT 등)
+    seq 없이 "<COMMAND>"만 보내면 리시버는 응답하지 않습니다 (구버전 호환).
+    요청 본문의 '\\', 줄바꿈, CR은 '\\\\', '\\n', '\\r'로 이스케이프합니다 (여러 줄 TYPE 텍스트).
+"""
+import socket
+import threading
+import time
+import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def escape_line(command: str) -> str:
+    """명령을 한 줄로 만들기 위한 이스케이프 (리시버의 unescape_line과 짝)"""
+    return command.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class CommandClient:
+    """
+    리시버와의 장기 연결을 유지하는 명령 클라이언트
+
+    하나의 TCP 연결로 명령을 파이프라이닝(응답을 기다리지 않고 연속 전송)하고,
+    응답은 별도 수신 스레드가 seq 번호로 매칭하여 Future에 전달합니다.
+    연결이 끊어지면 다음 전송 시 자동으로 재연결합니다.
+    """
+
+    def __init__(self, host: str, port: int, connect_timeout: float = 3.0,
+                 ack_timeout: float = 5.0, reconnect_delay: float = 1.0):
+        """
+        CommandClient 초기화
+
+        Args:
+            host: 리시버 IP
+            port: 리시버 포트
+            connect_timeout: 연결 타임아웃 (초)
+            ack_timeout: send(wait=True)의 기본 응답 대기 시간 (초)
+            reconnect_delay: 재연결 실패 후 다음 시도까지 최소 간격 (초)
+        """
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.ack_timeout = ack_timeout
+        self.reconnect_delay = reconnect_delay
+
+        self._sock = None
+        self._lock = threading.Lock()  # 연결 생성/전송 직렬화
+        self._pending: Dict[int, Tuple[socket.socket, Future]] = {}
+        self._pending_lock = threading.Lock()
+        self._seq = 0
+        self._last_connect_fail = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def _connect(self):
+        """연결 생성 (self._lock 보유 상태에서 호출)"""
+        if self._sock is not None:
+            return
+        if time.time() - self._last_connect_fail < self.reconnect_delay:
+            raise ConnectionError("재연결 대기 중")
+
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        except OSError:
+            self._last_connect_fail = time.time()
+            raise
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+
+        reader = threading.Thread(target=self._read_loop, args=(sock,),
+                                  name="CommandClientReader", daemon=True)
+        reader.start()
+        logger.info(f"🔗 리시버 연결: {self.host}:{self.port}")
+
+    def _drop(self, sock, reason: str):
+        """연결 정리 후 대기 중인 요청을 실패 처리"""
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+        with self._pending_lock:
+            failed = [seq for seq, (owner, _) in self._pending.items() if owner is sock]
+            futures = [self._pending.pop(seq)[1] for seq in failed]
+        for future in futures:
+            if not future.done():
+                future.set_exception(ConnectionError(reason))
+
+    def _read_loop(self, sock):
+        """응답 수신 스레드: 줄 단위로 잘라 seq별 Future 완료 (DATA 응답은 본문까지 수신)"""
+        buffer = bytearray()
+        payload = None  # 수신 중인 바이너리 응답 (seq, 바이트 수, 헤더)
+        try:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                while True:
+                    if payload is not None:
+                        seq, size, header = payload
+                        if len(buffer) < size:
+                            break
+                        self._handle_data(seq, header, bytes(buffer[:size]))
+                        del buffer[:size]
+                        payload = None
+                        continue
+
+                    end = buffer.find(b"\n")
+                    if end < 0:
+                        break
+                    line = buffer[:end].decode('utf-8', errors='replace').strip()
+                    del buffer[:end + 1]
+                    payload = self._parse_data_header(line)
+                    if payload is None:
+                        self._handle_reply(line)
+        except OSError as e:
+            self._drop(sock, f"수신 오류: {e}")
+            return
+        except ValueError as e:
+            # 잘못된 DATA 헤더 등 프레이밍이 깨진 응답: 이후 바이트를 해석할 수 없으므로 연결을 끊음
+            self._drop(sock, f"잘못된 응답: {e}")
+            return
+        self._drop(sock, "리시버가 연결을 종료했습니다")
+
+    @staticmethod
+    def _parse_data_header(line: str):
+        """"<seq>|DATA:<바이트 수>:<헤더>" → (seq, 바이트 수, 헤더), 아니면 None"""
+        seq, sep, body = line.partition("|")
+        if not sep or not seq.isdigit() or not body.startswith("DATA:"):
+            return None
+        size, _, header = body[len("DATA:"):].partition(":")
+        if not size.isdigit():
+            raise ValueError(f"잘못된 DATA 헤더: {line!r}")
+        return int(seq), int(size), header
+
+    def _handle_data(self, seq: int, header: str, data: bytes):
+        with self._pending_lock:
+            _, future = self._pending.pop(seq, (None, None))
+        if future is None or future.done():
+            return
+        future.set_result({'ok': True, 'message': header, 'data': data,
+                           'latency': time.time() - future.sent_at,
+                           'steps': future.steps})
+
+    def _handle_reply(self, line: str):
+        seq, sep, body = line.partition("|")
+        if not sep or not seq.isdigit():
+            # 연결 인사("OK") 등 seq가 없는 메시지
+            return
+
+        status, _, message = body.partition(":")
+        with self._pending_lock:
+            if status == "STEP":
+                _, future = self._pending.get(int(seq), (None, None))
+            else:
+                _, future = self._pending.pop(int(seq), (None, None))
+        if future is None or future.done():
+            return
+
+        if status == "STEP":
+            self._handle_step(future, message)
+            return
+        future.set_result({'ok': status == "OK", 'message': message,
+                           'latency': time.time() - future.sent_at,
+                           'steps': future.steps})
+
+    @staticmethod
+    def _handle_step(future: Future, message: str):
+        """워크플로우 단계 진행 상황 기록"""
+        index, status, elapsed_ms, command = (message.split(":", 3) + ["", "", ""])[:4]
+        step = {'index': int(index) if index.isdigit() else len(future.steps),
+                'ok': status == "OK",
+                'time': int(elapsed_ms) / 1000 if elapsed_ms.isdigit() else 0.0,
+                'command': command}
+        future.steps.append(step)
+        if future.on_step is not None:
+            try:
+                future.on_step(step)
+            except Exception as e:
+                logger.warning(f"on_step 콜백 오류: {e}")
+
+    def send(self, command: str, wait: bool = False, timeout: Optional[float] = None,
+             on_step: Optional[Callable[[Dict], None]] = None):
+        """
+        명령 전송
+
+        Args:
+            command: "MOVE:x,y", "CLICK", "TYPE:text" 등
+            wait: True면 응답을 받을 때까지 대기
+            timeout: 응답 대기 시간 (None이면 ack_timeout)
+            on_step: 워크플로우 단계가 끝날 때마다 {'index', 'ok', 'time', 'command'}로
+                호출 (수신 스레드에서 실행)
+
+        Returns:
+            wait=False: 응답 시 {'ok', 'message', 'latency', 'steps'}로 완료되는 Future
+            wait=True: 응답 딕셔너리
+        """
+        future = Future()
+        future.steps = []
+        future.on_step = on_step
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            payload = f"{seq}|{escape_line(command)}\n".encode('utf-8')
+
+            # 끊어진 연결이면 한 번 재연결 후 재전송
+            for attempt in range(2):
+                self._connect()
+                sock = self._sock
+                future.sent_at = time.time()
+                with self._pending_lock:
+                    self._pending[seq] = (sock, future)
+                try:
+                    sock.sendall(payload)
+                    break
+                except OSError:
+                    with self._pending_lock:
+                        self._pending.pop(seq, None)
+                    self._sock = None
+                    sock.close()
+                    if attempt == 1:
+                        raise
+
+        future.add_done_callback(lambda f, c=command: self._log_failure(f, c))
+        if wait:
+            try:
+                return future.result(timeout if timeout is not None else self.ack_timeout)
+            finally:
+                # 타임아웃 시 늦게 온 응답이 쌓이지 않도록 대기 목록에서 제거
+                with self._pending_lock:
+                    self._pending.pop(seq, None)
+        return future
+
+    @staticmethod
+    def _log_failure(future: Future, command: str):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.warning(f"⚠️ 응답 없음: {command} - {future.exception()}")
+        elif not future.result()['ok']:
+            logger.warning(f"⚠️ 리시버 오류: {command} - {future.result()['message']}")
+
+    def run_workflow(self, workflow: str, timeout: float = 60.0,
+                     on_step: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        워크플로우를 한 번의 요청으로 실행하고 완료까지 대기
+        
+        Args:
+            workflow: SmartCommandBuilder.build_workflow_command() 결과
+            timeout: 전체 완료 대기 시간 (초)
+            on_step: 단계별 진행 콜백
+
+        Returns:
+            {'ok', 'message', 'latency', 'steps': [{'index', 'ok', 'time', 'command'}, ...]}
+        """
+        return self.send(workflow, wait=True, timeout=timeout, on_step=on_step)
+
+    def grab_screenshot(self, fmt: str = 'jpeg', roi: Optional[Tuple[int, int, int, int]] = None,
+                        quality: int = 85, timeout: float = 10.0) -> Optional[np.ndarray]:
+        """
+        대상 PC 화면을 리시버에서 직접 캡처해 가져오기 (캡처보드 경유 없음)
+        
+        Args:
+            fmt: 'jpeg', 'png'(무손실) 또는 'raw'(무압축)
+            roi: (x1, y1, x2, y2) 대상 화면 좌표, None이면 전체 화면
+            quality: JPEG 품질
+            timeout: 응답 대기 시간 (초)
+
+        Returns:
+            BGR 프레임 (실패 시 None)
+        """
+        command = f"SCREENSHOT:{fmt}"
+        command += ":" + (",".join(str(int(v)) for v in roi) if roi else "")
+        command += f":{quality}"
+        try:
+            result = self.send(command, wait=True, timeout=timeout)
+        except (OSError, FutureTimeoutError) as e:
+            # 연결 실패/끊김(ConnectionError)과 응답 시간 초과(TimeoutError)
+            logger.warning(f"⚠️ 스크린샷 실패: {e or type(e).__name__}")
+            return None
+        if not result['ok'] or 'data' not in result:
+            logger.warning(f"⚠️ 스크린샷 실패: {result['message']}")
+            return None
+
+        kind, width, height = result['message'].split(":")
+        if kind == 'raw':
+            rgb = np.frombuffer(result['data'], dtype=np.uint8).reshape(int(height), int(width), 3)
+            return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        return cv2.imdecode(np.frombuffer(result['data'], dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def close(self):
+        """연결 종료"""
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            self._drop(sock, "클라이언트 종료")
@@ -0,0 +1,139 @@
+"""
+화면 분석 결과의 열(column) 기반 요소 표현
+"""
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+
+class ElementTable:
+    """
+    UI 요소 목록의 구조체 배열(SoA) 표현
+
+    bbox/center/confidence/type 등을 요소별 딕셔너리 대신 NumPy 배열로 보관하고,
+    라벨과 타입 문자열은 중복 없이 한 번만 저장합니다(intern).
+    요소 딕셔너리 목록처럼 len()/인덱싱/반복을 지원하며, 이때 반환되는
+    딕셔너리는 요청 시점에 만들어지는 사본입니다 (수정해도 표에는 반영되지 않음).
+    """
+
+    def __init__(self, bboxes: np.ndarray, centers: np.ndarray, confidences: np.ndarray,
+                 type_codes: np.ndarray, type_names: List[str], label_ids: np.ndarray,
+                 labels: List[str], interactable: np.ndarray, ids: np.ndarray,
+                 descriptions: List[str]):
+        self.bboxes = bboxes              # (N, 4) int32, x1 y1 x2 y2
+        self.centers = centers            # (N, 2) int32
+        self.confidences = confidences    # (N,) float32
+        self.type_codes = type_codes      # (N,) uint8 → type_names
+        self.type_names = type_names
+        self.label_ids = label_ids        # (N,) int32 → labels
+        self.labels = labels
+        self.interactable = interactable  # (N,) bool
+        self.ids = ids                    # (N,) int64, ID 없으면 -1
+        self.descriptions = descriptions  # 요소별 설명 (문자열 목록)
+
+    @classmethod
+    def from_elements(cls, elements: Iterable[Dict[str, Any]]) -> "ElementTable":
+        """요소 딕셔너리 목록으로부터 생성"""
+        if isinstance(elements, ElementTable):
+            return elements
+        elements = list(elements)
+        n = len(elements)
+        bboxes = np.zeros((n, 4), dtype=np.int32)
+        centers = np.zeros((n, 2), dtype=np.int32)
+        confidences = np.zeros(n, dtype=np.float32)
+        type_codes = np.zeros(n, dtype=np.uint8)
+        label_ids = np.zeros(n, dtype=np.int32)
+        interactable = np.zeros(n, dtype=bool)
+        ids = np.full(n, -1, dtype=np.int64)
+        descriptions = []
+
+        type_index: Dict[str, int] = {}
+        label_index: Dict[str, int] = {}
+        for i, element in enumerate(elements):
+            bboxes[i] = element.get('bbox', (0, 0, 0, 0))
+            centers[i] = element.get('center', (0, 0))
+            confidences[i] = element.get('confidence', 0)
+            type_codes[i] = type_index.setdefault(element.get('type', 'unknown'), len(type_index))
+            label_ids[i] = label_index.setdefault(element.get('label', ''), len(label_index))
+            interactable[i] = bool(element.get('interactable', False))
+            ids[i] = element.get('id', -1)
+            descriptions.append(element.get('description', ''))
+
+        return cls(bboxes, centers, confidences, type_codes, list(type_index), label_ids,
+                   list(label_index), interactable, ids, descriptions)
+
+    def __len__(self) -> int:
+        return len(self.bboxes)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        element = {
+            'type': self.type_names[self.type_codes[index]],
+            'label': self.labels[self.label_ids[index]],
+            'bbox': tuple(int(v) for v in self.bboxes[index]),
+            'center': tuple(int(v) for v in self.centers[index]),
+            'confidence': float(self.confidences[index]),
+            'description': self.descriptions[index],
+            'interactable': bool(self.interactable[index]),
+        }
+        if self.ids[index] >= 0:
+            element['id'] = int(self.ids[index])
+        return element
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_elements(self) -> List[Dict[str, Any]]:
+        """요소 딕셔너리 목록으로 변환"""
+        return list(self)
+
+    def take(self, indices: Sequence[int]) -> "ElementTable":
+        """
+        일부 요소만 담은 표 (라벨/타입 테이블은 공유)
+
+        Args:
+            indices: 정수 인덱스 배열 또는 길이 N의 bool 마스크
+        """
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return ElementTable(self.bboxes[indices], self.centers[indices], self.confidences[indices],
+                            self.type_codes[indices], self.type_names, self.label_ids[indices],
+                            self.labels, self.interactable[indices], self.ids[indices],
+                            [self.descriptions[i] for i in indices])
+
+    def type_mask(self, types: Iterable[str]) -> np.ndarray:
+        """주어진 타입인 요소의 bool 마스크"""
+        types = set(types)
+        codes = [code for code, name in enumerate(self.type_names) if name in types]
+        return np.isin(self.type_codes, codes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON 직렬화용 딕셔너리 (열 단위)"""
+        return {
+            'bboxes': self.bboxes.tolist(),
+            'centers': self.centers.tolist(),
+            'confidences': self.confidences.tolist(),
+            'type_codes': self.type_codes.tolist(),
+            'type_names': self.type_names,
+            'label_ids': self.label_ids.tolist(),
+            'labels': self.labels,
+            'interactable': self.interactable.tolist(),
+            'ids': self.ids.tolist(),
+            'descriptions': self.descriptions,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ElementTable":
+        """to_dict() 결과로부터 복원"""
+        return cls(np.asarray(data['bboxes'], dtype=np.int32).reshape(-1, 4),
+                   np.asarray(data['centers'], dtype=np.int32).reshape(-1, 2),
+                   np.asarray(data['confidences'], dtype=np.float32),
+                   np.asarray(data['type_codes'], dtype=np.uint8), list(data['type_names']),
+                   np.asarray(data['label_ids'], dtype=np.int32), list(data['labels']),
+                   np.asarray(data['interactable'], dtype=bool),
+                   np.asarray(data['ids'], dtype=np.int64), list(data['descriptions']))
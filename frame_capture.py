@@ -0,0 +1,154 @@
+"""
+캡처보드 프레임을 전용 스레드에서 읽어오는 모듈
+"""
+import threading
+import time
+import logging
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FrameGrabber:
+    """
+    캡처 전용 워커 스레드 + 최신 프레임 링 버퍼
+
+    워커 스레드만 VideoCapture를 열고/읽고/다시 열며, 미리 할당한 NumPy 버퍼를
+    순환하면서 프레임을 기록합니다. 기록이 끝난 슬롯 번호를 마지막에
+    공개하므로 읽는 쪽은 락 없이 항상 가장 최근에 완성된 프레임을 봅니다.
+    """
+
+    def __init__(self, source: Union[int, str], ring_size: int = 4,
+                 frame_shape: Tuple[int, int, int] = (1080, 1920, 3),
+                 reopen_interval: float = 0.5):
+        """
+        FrameGrabber 초기화
+
+        Args:
+            source: VideoCapture 장치 인덱스 또는 경로 (워커 스레드가 열고 소유)
+            ring_size: 링 버퍼 슬롯 수 (최소 3)
+            frame_shape: 버퍼 초기 크기이자 요청 해상도 (첫 프레임 크기가 다르면 재할당)
+            reopen_interval: 장치가 닫혀 있을 때 다시 열기 시도 간격 (초)
+        """
+        self.source = source
+        self.frame_shape = frame_shape
+        self.reopen_interval = reopen_interval
+        self.cap = None
+        self.ring_size = max(3, ring_size)
+        self._buffers = [np.empty(frame_shape, dtype=np.uint8) for _ in range(self.ring_size)]
+        # (슬롯 번호, 시퀀스 번호, 타임스탬프) 튜플 - 통째로 교체되므로 원자적으로 읽힘
+        self._latest = (-1, 0, 0.0)
+        self._thread = None
+        self._running = False
+        self.signal_lost = False
+        self.fps = 0.0
+
+    def start(self):
+        """캡처 스레드 시작 (이미 실행 중이면 무시)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        logger.info("📷 캡처 스레드 시작")
+
+    def stop(self, timeout: float = 1.0):
+        """캡처 스레드 종료"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_opened(self) -> bool:
+        """캡처 장치가 열려 있는지 (워커가 관리하는 상태)"""
+        return self.cap is not None and self.cap.isOpened()
+
+    def _open(self) -> bool:
+        """장치 열기 (워커 스레드에서만 호출)"""
+        if self.cap is None:
+            self.cap = cv2.VideoCapture(self.source)
+        elif not self.cap.isOpened():
+            self.cap.open(self.source)
+        if not self.cap.isOpened():
+            return False
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_shape[1])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_shape[0])
+        return True
+
+    def _run(self):
+        slot, seq, _ = self._latest
+        last_time = time.time()
+
+        while self._running:
+            if self.cap is None or not self.cap.isOpened():
+                if not self._open():
+                    self.signal_lost = True
+                    time.sleep(self.reopen_interval)
+                    continue
+
+            slot = (slot + 1) % self.ring_size
+            buf = self._buffers[slot]
+            # 출력 버퍼를 넘겨 재사용 (크기가 맞지 않으면 OpenCV가 새로 할당)
+            ret, frame = self.cap.read(buf)
+            if not ret:
+                if not self.signal_lost:
+                    logger.warning("HDMI 신호 없음")
+                self.signal_lost = True
+                time.sleep(0.05)
+                continue
+
+            if frame is not buf:
+                self._buffers[slot] = frame
+
+            now = time.time()
+            dt = now - last_time
+            last_time = now
+            if dt > 0:
+                self.fps = 0.9 * self.fps + 0.1 * (1.0 / dt)
+
+            seq += 1
+            self.signal_lost = False
+            self._latest = (slot, seq, now)
+
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        logger.info("📷 캡처 스레드 종료")
+
+    def latest(self) -> Tuple[Optional[np.ndarray], int]:
+        """
+        가장 최근 프레임 조회 (복사 없음)
+
+        반환되는 배열은 링 버퍼 슬롯의 읽기 전용 뷰입니다.
+        워커가 ring_size - 1 프레임을 더 기록하기 전까지 유효하므로,
+        오래 보관하거나 그 위에 그림을 그려야 한다면 복사해서 사용하세요.
+
+        Returns:
+            (BGR 프레임 또는 None, 시퀀스 번호)
+        """
+        slot, seq, _ = self._latest
+        if slot < 0:
+            return None, 0
+        view = self._buffers[slot].view()
+        view.flags.writeable = False
+        return view, seq
+
+    def wait_for_frame(self, last_seq: int, timeout: float = 0.1) -> Tuple[Optional[np.ndarray], int]:
+        """
+        last_seq 이후의 새 프레임이 들어올 때까지 대기
+
+        Returns:
+            (BGR 프레임 또는 None, 시퀀스 번호) - 타임아웃 시 기존 프레임 반환
+        """
+        deadline = time.time() + timeout
+        while self._latest[1] == last_seq and time.time() < deadline:
+            time.sleep(0.002)
+        return self.latest()
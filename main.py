@@ -1,18 +1,27 @@
 import streamlit as st
 import cv2
 import numpy as np
-import socket
 import time
 import logging
 # OmniParser 관련 임포트가 없다면 주석 처리하거나 더미 클래스를 만드세요.
 from omniparser_analyzer import ScreenAnalyzer
 from advanced_ui_controller import AdvancedUIController
+from frame_capture import FrameGrabber
+from command_client import CommandClient
+from preview_server import PreviewServer
 
 # --- [사용자 설정] ---
 TARGET_IP = '192.168.219.105'  # 보안 PC IP
 TARGET_PORT = 9999
 CAMERA_INDEX = 0  # 캡처보드 인덱스
 
+# --- [미리보기 설정] ---
+PREVIEW_STREAM = True      # True: 내장 HTTP 스트림 임베드, False: st.image로 프레임 전송
+PREVIEW_PORT = 8502
+PREVIEW_FORMAT = 'jpeg'    # 'jpeg' (MJPEG) 또는 'webp'
+PREVIEW_QUALITY = 75
+PREVIEW_MAX_WIDTH = 1280   # 스트림 해상도 상한 (0이면 원본)
+
 # --- [로깅 설정] ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -81,20 +90,40 @@ st.markdown("""
 
 
 # --- [통신 함수] ---
-def send_command_to_target(command):
+@st.cache_resource
+def get_command_client():
+    """리시버와의 영구 연결 (모든 세션/호출자가 공유)"""
+    return CommandClient(TARGET_IP, TARGET_PORT, connect_timeout=3.0)
+
+
+def send_command_to_target(command, wait=False):
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(3.0)
-        sock.connect((TARGET_IP, TARGET_PORT))
-        sock.sendall(command.encode('utf-8'))
-        sock.close()
+        result = get_command_client().send(command, wait=wait)
         logger.info(f"✅ 명령 전송 성공: {command}")
-        return True
+        return result['ok'] if wait else True
     except Exception as e:
         logger.error(f"❌ 명령 전송 실패: {command} - {e}")
         return False
 
 
+@st.cache_resource
+def get_preview_server():
+    """미리보기 스트림 서버 (프로세스당 하나)"""
+    server = PreviewServer(port=PREVIEW_PORT, fmt=PREVIEW_FORMAT,
+                           quality=PREVIEW_QUALITY, max_width=PREVIEW_MAX_WIDTH)
+    server.start()
+    return server
+
+
+def preview_url(server):
+    """브라우저가 대시보드에 접속한 호스트 기준 스트림 주소"""
+    host = None
+    context = getattr(st, "context", None)
+    if context is not None:
+        host = context.headers.get("Host", "").split(":")[0] or None
+    return server.url(host)
+
+
 # --- [오버레이 함수] ---
 def draw_modern_overlay(frame, x, y, label=None, color=(230, 0, 126)):
     cv2.rectangle(frame, (x - 80, y - 30), (x + 80, y + 30), color, 2, cv2.LINE_AA)
@@ -114,10 +143,9 @@ if "demo_state" not in st.session_state:
     st.session_state.demo_state = "IDLE"
 if "step_start_time" not in st.session_state:
     st.session_state.step_start_time = 0
-if "cap" not in st.session_state:
-    st.session_state.cap = cv2.VideoCapture(CAMERA_INDEX)
-    st.session_state.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-    st.session_state.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
+# 캡처 스레드 (VideoCapture 열기/읽기/재연결은 이 워커만 수행)
+if "grabber" not in st.session_state:
+    st.session_state.grabber = FrameGrabber(CAMERA_INDEX, frame_shape=(1080, 1920, 3))
 
 # 분석기 초기화 (최초 1회)
 if "analyzer" not in st.session_state:
@@ -170,18 +198,30 @@ with col_screen:
     st.markdown('<div style="border-radius: 10px; overflow: hidden; box-shadow: 0 4px 12px rgba(0,0,0,0.1);">', unsafe_allow_html=True)
     
     frame_placeholder = st.empty()
-    cap = st.session_state.cap
+    grabber = st.session_state.grabber
+    grabber.start()
     
-    if not cap.isOpened():
-        cap.open(CAMERA_INDEX)
+    preview = None
+    if PREVIEW_STREAM:
+        # 브라우저가 스트림을 직접 재생하므로 루프에서는 프레임만 넘김
+        preview = get_preview_server()
+        frame_placeholder.markdown(
+            f'<img src="{preview_url(preview)}" style="width: 100%; display: block;">',
+            unsafe_allow_html=True)
     
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
+    last_seq = 0
+    while grabber.is_running:
+        # 캡처 스레드가 기록한 최신 프레임 (복사 없음, 읽기 전용)
+        raw_frame, seq = grabber.wait_for_frame(last_seq)
+        if grabber.signal_lost:
             frame_placeholder.error("HDMI Signal Lost")
             break
+        if raw_frame is None or seq == last_seq:
+            continue
+        last_seq = seq
         
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # 색 변환 결과가 오버레이를 그릴 새 버퍼가 됨
+        frame = cv2.cvtColor(raw_frame, cv2.COLOR_BGR2RGB)
         h, w, _ = frame.shape
         THEME_COLOR = (230, 0, 126)
         current_state = st.session_state.demo_state
@@ -209,7 +249,9 @@ with col_screen:
             if elapsed > 2.0:
                 st.session_state.demo_state = "IDLE"
         
-        frame_placeholder.image(frame, channels="RGB")
-        time.sleep(0.03)
+        if preview is not None:
+            preview.publish(frame, channels="RGB")
+        else:
+            frame_placeholder.image(frame, channels="RGB")
 
     st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
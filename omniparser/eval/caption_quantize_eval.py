@@ -0,0 +1,87 @@
+"""
+Florence-2 icon captioning on cpu: float32 vs INT8 dynamic quantization vs bf16.
+
+Each mode runs in its own process so resident memory is measured in isolation. Captions of the
+reduced-precision modes are compared with the float32 captions of the same fixed icon set.
+
+Run from the omniparser directory:
+    python -m eval.caption_quantize_eval --icons imgs/icons --caption_model_path weights/icon_caption_florence
+"""
+import argparse
+import difflib
+import glob
+import multiprocessing
+import os
+import resource
+import time
+
+import cv2
+import numpy as np
+
+
+def load_icons(path, size=64):
+    """(K, 3, size, size) float crops in 0..255, the layout get_parsed_content_icon uses for Florence."""
+    paths = sorted(glob.glob(os.path.join(path, '*.png')) + glob.glob(os.path.join(path, '*.jpg')))
+    icons = [cv2.resize(cv2.cvtColor(cv2.imread(p), cv2.COLOR_BGR2RGB), (size, size)) for p in paths]
+    return paths, np.stack(icons).transpose(0, 3, 1, 2).astype(np.float32)
+
+
+def run_mode(mode, args, queue):
+    import torch
+    from util.utils import get_caption_model_processor, caption_crops
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    paths, icons = load_icons(args.icons)
+    crops = torch.from_numpy(icons)
+    start = time.perf_counter()
+    caption_model_processor = get_caption_model_processor('florence2', args.caption_model_path, device='cpu',
+                                                          quantize=None if mode == 'fp32' else mode)
+    load_s = time.perf_counter() - start
+
+    with torch.inference_mode():
+        caption_crops(crops[:args.batch_size], caption_model_processor, '<CAPTION>', args.batch_size)  # warm-up
+        start = time.perf_counter()
+        captions = caption_crops(crops, caption_model_processor, '<CAPTION>', args.batch_size)
+        caption_s = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on Linux
+    queue.put({'mode': mode, 'captions': captions, 'load_s': load_s, 'captions_per_s': len(crops) / caption_s,
+               'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Caption model quantization benchmark')
+    parser.add_argument('--icons', type=str, required=True, help='directory of icon images (the fixed evaluation set)')
+    parser.add_argument('--caption_model_path', type=str, default='weights/icon_caption_florence')
+    parser.add_argument('--modes', type=str, nargs='+', default=['fp32', 'int8', 'bf16'], choices=['fp32', 'int8', 'bf16'])
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--threads', type=int, default=0, help='torch cpu threads (0 = default)')
+    args = parser.parse_args()
+
+    modes = ['fp32'] + [mode for mode in args.modes if mode != 'fp32']
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for mode in modes:
+        queue = context.Queue()
+        process = context.Process(target=run_mode, args=(mode, args, queue))
+        process.start()
+        results[mode] = queue.get()
+        process.join()
+
+    reference = results['fp32']['captions']
+    print(f"{len(reference)} icons")
+    print(f"{'mode':<6}{'exact':>8}{'similarity':>12}{'captions/s':>12}{'peak RSS MB':>13}{'load s':>8}")
+    for mode in modes:
+        r = results[mode]
+        exact = np.mean([a == b for a, b in zip(reference, r['captions'])])
+        similarity = np.mean([difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, r['captions'])])
+        print(f"{mode:<6}{exact:>8.3f}{similarity:>12.3f}{r['captions_per_s']:>12.1f}{r['peak_rss_mb']:>13.0f}{r['load_s']:>8.1f}")
+    for mode in modes[1:]:
+        changed = [(ref, cap) for ref, cap in zip(reference, results[mode]['captions']) if ref != cap]
+        for ref, cap in changed[:5]:
+            print(f"  {mode}: {ref!r} -> {cap!r}")
+
+
+if __name__ == '__main__':
+    main()
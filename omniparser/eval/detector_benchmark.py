@@ -0,0 +1,82 @@
+"""
+Latency and agreement of the icon detector backends (Ultralytics PyTorch vs ONNX Runtime).
+
+Run from the omniparser directory:
+    python -m eval.detector_benchmark --images imgs --runs 10 --onnx_intra_op_threads 4
+"""
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from util.utils import get_yolo_model, predict_yolo
+
+
+def box_iou(a, b):
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def agreement(reference, candidate, iou=0.9):
+    """Fraction of reference boxes with a candidate box above `iou`, and the worst coordinate error (px) among them."""
+    if len(reference) == 0 or len(candidate) == 0:
+        return float(len(reference) == len(candidate)), 0.0
+    ious = box_iou(reference, candidate)
+    best = ious.argmax(axis=1)
+    matched = ious[np.arange(len(reference)), best] >= iou
+    error = np.abs(reference[matched] - candidate[best[matched]]).max() if matched.any() else 0.0
+    return matched.mean(), float(error)
+
+
+def time_backend(model, images, args):
+    latencies, boxes = [], []
+    for image in images:
+        predict_yolo(model, image, args.box_threshold, None, False, args.iou_threshold)  # warm-up
+        runs = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            xyxy, _, _ = predict_yolo(model, image, args.box_threshold, None, False, args.iou_threshold)
+            runs.append(time.perf_counter() - start)
+        latencies.append(np.median(runs))
+        boxes.append(xyxy.cpu().numpy())
+    return np.array(latencies) * 1000, boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Icon detector backend benchmark')
+    parser.add_argument('--som_model_path', type=str, default='weights/icon_detect/model.pt')
+    parser.add_argument('--images', type=str, default='imgs', help='image file or directory')
+    parser.add_argument('--runs', type=int, default=10, help='timed runs per image')
+    parser.add_argument('--box_threshold', type=float, default=0.05)
+    parser.add_argument('--iou_threshold', type=float, default=0.1)
+    parser.add_argument('--onnx_intra_op_threads', type=int, default=0)
+    parser.add_argument('--onnx_inter_op_threads', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.images, '*.png')) + glob.glob(os.path.join(args.images, '*.jpg'))) \
+        if os.path.isdir(args.images) else [args.images]
+    images = [Image.open(path).convert('RGB') for path in paths]
+
+    torch_model = get_yolo_model(args.som_model_path, backend='torch')
+    onnx_model = get_yolo_model(args.som_model_path, backend='onnx', intra_op_threads=args.onnx_intra_op_threads,
+                                inter_op_threads=args.onnx_inter_op_threads)
+    torch_ms, torch_boxes = time_backend(torch_model, images, args)
+    onnx_ms, onnx_boxes = time_backend(onnx_model, images, args)
+
+    print(f"{'image':<32}{'boxes':>8}{'torch ms':>10}{'onnx ms':>10}{'matched':>9}{'max err':>9}")
+    for path, t, o, tb, ob in zip(paths, torch_ms, onnx_ms, torch_boxes, onnx_boxes):
+        matched, error = agreement(tb, ob)
+        print(f"{os.path.basename(path)[:31]:<32}{len(tb):>4}/{len(ob):<3}{t:>10.1f}{o:>10.1f}{matched:>9.3f}{error:>9.2f}")
+    print(f"median latency: torch {np.median(torch_ms):.1f} ms, onnx {np.median(onnx_ms):.1f} ms "
+          f"({np.median(torch_ms) / np.median(onnx_ms):.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -16,10 +16,21 @@ from util.omniparser import Omniparser
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Omniparser API')
     parser.add_argument('--som_model_path', type=str, default='../../weights/icon_detect/model.pt', help='Path to the som model')
+    parser.add_argument('--som_backend', type=str, default='torch', choices=['torch', 'onnx'], help='Icon detector runtime (onnx exports the .pt on first use)')
+    parser.add_argument('--onnx_intra_op_threads', type=int, default=0, help='ONNX Runtime threads per operator (0 = default)')
+    parser.add_argument('--onnx_inter_op_threads', type=int, default=0, help='ONNX Runtime threads across operators (0 = default)')
     parser.add_argument('--caption_model_name', type=str, default='florence2', help='Name of the caption model')
     parser.add_argument('--caption_model_path', type=str, default='../../weights/icon_caption_florence', help='Path to the caption model')
+    parser.add_argument('--caption_quantize', type=str, default=None, choices=['int8', 'bf16'], help='Reduced-precision caption model on cpu (default float32)')
     parser.add_argument('--device', type=str, default='cpu', help='Device to run the model')
     parser.add_argument('--BOX_TRESHOLD', type=float, default=0.05, help='Threshold for box detection')
+    parser.add_argument('--ocr_engine', type=str, default='easyocr', choices=['easyocr', 'paddleocr'], help='OCR engine (loaded on first request)')
+    parser.add_argument('--som_encoding', type=str, default='png', choices=['png', 'jpeg'], help='Encoding of the returned SOM image')
+    parser.add_argument('--som_quality', type=int, default=85, help='JPEG quality when --som_encoding jpeg')
+    parser.add_argument('--caption_cache_size', type=int, default=0, help='Icon caption cache entries kept in memory, e.g. 4096 (0 disables the cache). Lossy: keyed by a perceptual hash, so near-identical icons share a caption')
+    parser.add_argument('--caption_cache_path', type=str, default=None, help='SQLite file to persist icon captions across restarts')
+    parser.add_argument('--caption_batch_size', type=int, default=128, help='Most icon crops per captioning batch')
+    parser.add_argument('--caption_max_wait', type=float, default=0.01, help='Seconds a request waits for other requests to share its captioning batch (0 disables)')
     parser.add_argument('--host', type=str, default='127.0.0.1', help='Host for the API')
     parser.add_argument('--port', type=int, default=8000, help='Port for the API')
     args = parser.parse_args()
@@ -33,19 +44,28 @@ omniparser = Omniparser(config)
 
 class ParseRequest(BaseModel):
     base64_image: str
+    render_som: bool = True  # False: skip drawing/encoding the SOM image (som_image_base64 is null)
 
+# a plain def runs in FastAPI's threadpool, so concurrent requests overlap and share caption batches
 @app.post("/parse/")
-async def parse(parse_request: ParseRequest):
+def parse(parse_request: ParseRequest):
     print('start parsing...')
     start = time.time()
-    dino_labled_img, parsed_content_list = omniparser.parse(parse_request.base64_image)
+    dino_labled_img, parsed_content_list = omniparser.parse(parse_request.base64_image, render_som=parse_request.render_som)
+    if not parse_request.render_som:
+        dino_labled_img = None
     latency = time.time() - start
     print('time:', latency)
     return {"som_image_base64": dino_labled_img, "parsed_content_list": parsed_content_list, 'latency': latency}
 
 @app.get("/probe/")
 async def root():
-    return {"message": "Omniparser API ready"}
+    response = {"message": "Omniparser API ready"}
+    if omniparser.caption_cache is not None:
+        response["caption_cache"] = omniparser.caption_cache.stats()
+    if omniparser.caption_batcher is not None:
+        response["caption_batcher"] = {"batches": omniparser.caption_batcher.batches, "captions": omniparser.caption_batcher.captions}
+    return response
 
 if __name__ == "__main__":
     uvicorn.run("omniparserserver:app", host=args.host, port=args.port, reload=True)
\ No newline at end of file
@@ -85,8 +85,9 @@ class BoxAnnotator:
             ```
         """
         font = cv2.FONT_HERSHEY_SIMPLEX
+        int_boxes = detections.xyxy.astype(int)
         for i in range(len(detections)):
-            x1, y1, x2, y2 = detections.xyxy[i].astype(int)
+            x1, y1, x2, y2 = int_boxes[i]
             class_id = (
                 detections.class_id[i] if detections.class_id is not None else None
             )
@@ -135,7 +136,7 @@ class BoxAnnotator:
                 # text_background_x2 = x1
                 # text_background_y2 = y1 + 2 * self.text_padding + text_height
             else:
-                text_x, text_y, text_background_x1, text_background_y1, text_background_x2, text_background_y2 = get_optimal_label_pos(self.text_padding, text_width, text_height, x1, y1, x2, y2, detections, image_size)
+                text_x, text_y, text_background_x1, text_background_y1, text_background_x2, text_background_y2 = get_optimal_label_pos(self.text_padding, text_width, text_height, x1, y1, x2, y2, detections, image_size, boxes=int_boxes)
 
             cv2.rectangle(
                 img=scene,
@@ -186,77 +187,57 @@ def IoU(box1, box2, return_max=True):
         return intersection / union
 
 
-def get_optimal_label_pos(text_padding, text_width, text_height, x1, y1, x2, y2, detections, image_size):
+def get_label_overlaps(backgrounds, boxes, image_size, threshold=0.3):
+    """ vectorized overlap check of candidate text backgrounds against every detection box
+        backgrounds: (K, 4) candidate text background boxes, boxes: (N, 4) int detection boxes
+        returns: (K,) bool, True if a candidate overlaps any box (IoU/containment > threshold) or leaves the image
+    """
+    backgrounds = np.asarray(backgrounds)
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    inter_w = np.maximum(0, np.minimum(backgrounds[:, None, 2], boxes[None, :, 2]) - np.maximum(backgrounds[:, None, 0], boxes[None, :, 0]))
+    inter_h = np.maximum(0, np.minimum(backgrounds[:, None, 3], boxes[None, :, 3]) - np.maximum(backgrounds[:, None, 1], boxes[None, :, 1]))
+    intersection = inter_w * inter_h
+    background_area = ((backgrounds[:, 2] - backgrounds[:, 0]) * (backgrounds[:, 3] - backgrounds[:, 1]))[:, None]
+    box_areas = ((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))[None, :]
+    union = background_area + box_areas - intersection
+    both_positive = (background_area > 0) & (box_areas > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio1 = np.where(both_positive, intersection / np.where(background_area > 0, background_area, 1), 0)
+        ratio2 = np.where(both_positive, intersection / np.where(box_areas > 0, box_areas, 1), 0)
+        iou = np.maximum(np.maximum(intersection / union, ratio1), ratio2)
+    is_overlap = (iou > threshold).any(axis=1)
+    # check if the text is out of the image
+    out_of_image = (backgrounds[:, 0] < 0) | (backgrounds[:, 2] > image_size[0]) | (backgrounds[:, 1] < 0) | (backgrounds[:, 3] > image_size[1])
+    return is_overlap | out_of_image
+
+
+def get_optimal_label_pos(text_padding, text_width, text_height, x1, y1, x2, y2, detections, image_size, boxes=None):
     """ check overlap of text and background detection box, and get_optimal_label_pos, 
         pos: str, position of the text, must be one of 'top left', 'top right', 'outer left', 'outer right' TODO: if all are overlapping, return the last one, i.e. outer right
         Threshold: default to 0.3
+        All four candidates are checked against all detections at once; pass boxes=detections.xyxy.astype(int)
+        to reuse the integer boxes across calls.
     """
-
-    def get_is_overlap(detections, text_background_x1, text_background_y1, text_background_x2, text_background_y2, image_size):
-        is_overlap = False
-        for i in range(len(detections)):
-            detection = detections.xyxy[i].astype(int)
-            if IoU([text_background_x1, text_background_y1, text_background_x2, text_background_y2], detection) > 0.3:
-                is_overlap = True
-                break
-        # check if the text is out of the image
-        if text_background_x1 < 0 or text_background_x2 > image_size[0] or text_background_y1 < 0 or text_background_y2 > image_size[1]:
-            is_overlap = True
-        return is_overlap
-    
-    # if pos == 'top left':
-    text_x = x1 + text_padding
-    text_y = y1 - text_padding
-
-    text_background_x1 = x1
-    text_background_y1 = y1 - 2 * text_padding - text_height
-
-    text_background_x2 = x1 + 2 * text_padding + text_width
-    text_background_y2 = y1
-    is_overlap = get_is_overlap(detections, text_background_x1, text_background_y1, text_background_x2, text_background_y2, image_size)
-    if not is_overlap:
-        return text_x, text_y, text_background_x1, text_background_y1, text_background_x2, text_background_y2
-    
-    # elif pos == 'outer left':
-    text_x = x1 - text_padding - text_width
-    text_y = y1 + text_padding + text_height
-
-    text_background_x1 = x1 - 2 * text_padding - text_width
-    text_background_y1 = y1
-
-    text_background_x2 = x1
-    text_background_y2 = y1 + 2 * text_padding + text_height
-    is_overlap = get_is_overlap(detections, text_background_x1, text_background_y1, text_background_x2, text_background_y2, image_size)
-    if not is_overlap:
-        return text_x, text_y, text_background_x1, text_background_y1, text_background_x2, text_background_y2
-    
-
-    # elif pos == 'outer right':
-    text_x = x2 + text_padding
-    text_y = y1 + text_padding + text_height
-
-    text_background_x1 = x2
-    text_background_y1 = y1
-
-    text_background_x2 = x2 + 2 * text_padding + text_width
-    text_background_y2 = y1 + 2 * text_padding + text_height
-
-    is_overlap = get_is_overlap(detections, text_background_x1, text_background_y1, text_background_x2, text_background_y2, image_size)
-    if not is_overlap:
-        return text_x, text_y, text_background_x1, text_background_y1, text_background_x2, text_background_y2
-
-    # elif pos == 'top right':
-    text_x = x2 - text_padding - text_width
-    text_y = y1 - text_padding
-
-    text_background_x1 = x2 - 2 * text_padding - text_width
-    text_background_y1 = y1 - 2 * text_padding - text_height
-
-    text_background_x2 = x2
-    text_background_y2 = y1
-
-    is_overlap = get_is_overlap(detections, text_background_x1, text_background_y1, text_background_x2, text_background_y2, image_size)
-    if not is_overlap:
-        return text_x, text_y, text_background_x1, text_background_y1, text_background_x2, text_background_y2
-
-    return text_x, text_y, text_background_x1, text_background_y1, text_background_x2, text_background_y2
+    if boxes is None:
+        boxes = detections.xyxy.astype(int)
+
+    # (text_x, text_y, text_background_x1, text_background_y1, text_background_x2, text_background_y2)
+    candidates = [
+        # top left
+        (x1 + text_padding, y1 - text_padding,
+         x1, y1 - 2 * text_padding - text_height, x1 + 2 * text_padding + text_width, y1),
+        # outer left
+        (x1 - text_padding - text_width, y1 + text_padding + text_height,
+         x1 - 2 * text_padding - text_width, y1, x1, y1 + 2 * text_padding + text_height),
+        # outer right
+        (x2 + text_padding, y1 + text_padding + text_height,
+         x2, y1, x2 + 2 * text_padding + text_width, y1 + 2 * text_padding + text_height),
+        # top right
+        (x2 - text_padding - text_width, y1 - text_padding,
+         x2 - 2 * text_padding - text_width, y1 - 2 * text_padding - text_height, x2, y1),
+    ]
+    is_overlap = get_label_overlaps([candidate[2:] for candidate in candidates], boxes, image_size)
+    for candidate, overlap in zip(candidates, is_overlap):
+        if not overlap:
+            return candidate
+    return candidates[-1]
@@ -0,0 +1,141 @@
+"""
+Dynamic batching of icon captioning across concurrent parse requests.
+
+Each request submits its icon crops and blocks on a Future; a single worker thread gathers the
+crops of all requests in the same bucket (same prompt and crop size) until the batch is full or
+the oldest request has waited `max_wait` seconds, captions them in one model call and scatters
+the captions back.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+
+def _concat(parts):
+    if isinstance(parts[0], np.ndarray):
+        return np.concatenate(parts)
+    import torch
+    return torch.cat(list(parts))
+
+
+class CaptionBatcher:
+    """
+    Shared captioning scheduler.
+
+    Attributes:
+        batches (int): model calls made
+        captions (int): crops captioned
+    """
+
+    def __init__(self, generate: Callable[[object, str], Sequence[str]], max_batch: int = 128, max_wait: float = 0.01):
+        """
+        Args:
+            generate: generate(crops, prompt) -> one caption per crop (crops batched along dim 0)
+            max_batch: most crops per model call
+            max_wait: longest time (s) a request waits for others to join its batch
+        """
+        self.generate = generate
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._buckets: "OrderedDict[tuple, deque]" = OrderedDict()  # (prompt, crop shape) -> [[crops, offset, future, t]]
+        self._cond = threading.Condition()
+        self._closed = False
+        self.batches = 0
+        self.captions = 0
+        self._thread = threading.Thread(target=self._run, name="CaptionBatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, crops, prompt: str) -> Future:
+        """Queue crops for captioning; the Future resolves to their captions in order."""
+        future = Future()
+        if len(crops) == 0:
+            future.set_result([])
+            return future
+        future.parts = [None] * len(crops)
+        future.remaining = len(crops)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("CaptionBatcher is closed")
+            bucket = (prompt, tuple(crops.shape[1:]))
+            self._buckets.setdefault(bucket, deque()).append([crops, 0, future, time.time()])
+            self._cond.notify()
+        return future
+
+    def caption(self, crops, prompt: str) -> List[str]:
+        """Blocking submit()."""
+        return self.submit(crops, prompt).result()
+
+    def _ready_bucket(self):
+        """(bucket, wait) of the bucket to run next: full or past its deadline, else the shortest wait."""
+        now = time.time()
+        best_wait = None
+        for bucket, queue in self._buckets.items():
+            pending = sum(len(item[0]) - item[1] for item in queue)
+            wait = queue[0][3] + self.max_wait - now
+            if pending >= self.max_batch or wait <= 0:
+                return bucket, 0
+            best_wait = wait if best_wait is None else min(best_wait, wait)
+        return None, best_wait
+
+    def _take(self, bucket: tuple):
+        """Pop up to max_batch crops from a bucket: [(crops slice, future, offset)]."""
+        queue = self._buckets[bucket]
+        taken, size = [], 0
+        while queue and size < self.max_batch:
+            item = queue[0]
+            crops, offset, future = item[0], item[1], item[2]
+            count = min(len(crops) - offset, self.max_batch - size)
+            taken.append((crops[offset:offset + count], future, offset))
+            size += count
+            if offset + count >= len(crops):
+                queue.popleft()
+            else:
+                item[1] = offset + count
+        if not queue:
+            del self._buckets[bucket]
+        return taken
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed and not self._buckets:
+                        return
+                    bucket, wait = self._ready_bucket()
+                    if bucket is not None:
+                        break
+                    self._cond.wait(wait)
+                taken = self._take(bucket)
+            prompt = bucket[0]
+
+            try:
+                captions = list(self.generate(_concat([crops for crops, _, _ in taken]), prompt))
+            except Exception as e:
+                for _, future, _ in taken:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.captions += len(captions)
+            start = 0
+            for crops, future, offset in taken:
+                if future.done():
+                    start += len(crops)
+                    continue
+                future.parts[offset:offset + len(crops)] = captions[start:start + len(crops)]
+                future.remaining -= len(crops)
+                start += len(crops)
+                if future.remaining == 0:
+                    future.set_result(future.parts)
+
+    def close(self):
+        """Finish queued work and stop the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
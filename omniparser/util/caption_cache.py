@@ -0,0 +1,160 @@
+"""
+Content-addressed cache for icon captions.
+
+Captions are keyed on a perceptual difference hash (dHash) of the 64x64 icon crop plus the
+caption model name and prompt, so the same toolbar/taskbar icons are captioned once and then
+served from memory (LRU) or, optionally, from a SQLite file that survives restarts.
+
+The cache is lossy by design: dHash ignores small pixel differences, so two different icons
+that look nearly the same (e.g. a toggle in two close states) get the same caption.
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def dhash(crops, hash_size: int = 16, channels_first: bool = False) -> List[str]:
+    """
+    Difference hash of each crop.
+
+    crops: (K, H, W, 3) or, with channels_first, (K, 3, H, W) array/tensor in 0..255;
+        H and W must be multiples of hash_size (64x64 crops with the default 16)
+    Returns one hex string per crop (hash_size * (hash_size - 1) bits).
+    """
+    crops = np.asarray(crops, dtype=np.float32)
+    if len(crops) == 0:
+        return []
+    if channels_first:
+        crops = crops.transpose(0, 2, 3, 1)
+    gray = crops @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    k, h, w = gray.shape
+    pooled = gray.reshape(k, hash_size, h // hash_size, hash_size, w // hash_size).mean(axis=(2, 4))
+    bits = pooled[:, :, 1:] > pooled[:, :, :-1]
+    packed = np.packbits(bits.reshape(k, -1), axis=1)
+    return [row.tobytes().hex() for row in packed]
+
+
+class CaptionCache:
+    """
+    LRU caption cache with an optional on-disk tier and hit/miss counters.
+
+    Attributes:
+        hits (int): lookups answered from memory
+        disk_hits (int): lookups answered from the disk tier (promoted to memory)
+        misses (int): lookups that needed the caption model
+    """
+
+    def __init__(self, max_entries: int = 4096, path: Optional[str] = None, hash_size: int = 16):
+        """
+        Args:
+            max_entries: in-memory LRU capacity
+            path: SQLite file for the persistent tier (None keeps the cache in memory only)
+            hash_size: dHash grid size (crop sides must be multiples of it)
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.hash_size = hash_size
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS captions (key TEXT PRIMARY KEY, caption TEXT NOT NULL)")
+            self._db.commit()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self, crops, model_name: str, prompt: str, channels_first: bool = False) -> List[str]:
+        """Cache keys for a batch of crops captioned by `model_name` with `prompt`."""
+        return [f"{model_name}|{prompt}|{h}" for h in dhash(crops, self.hash_size, channels_first)]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            caption = self._entries.get(key)
+            if caption is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return caption
+            if self._db is not None:
+                row = self._db.execute("SELECT caption FROM captions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.disk_hits += 1
+                    self._remember(key, row[0])
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put_many(self, items: Dict[str, str]):
+        with self._lock:
+            for key, caption in items.items():
+                self._remember(key, caption)
+            if self._db is not None and items:
+                self._db.executemany("INSERT OR REPLACE INTO captions (key, caption) VALUES (?, ?)", list(items.items()))
+                self._db.commit()
+
+    def put(self, key: str, caption: str):
+        self.put_many({key: caption})
+
+    def _remember(self, key: str, caption: str):
+        self._entries[key] = caption
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def caption(self, crops, model_name: str, prompt: str, generate: Callable[[List[int]], Sequence[str]],
+                channels_first: bool = False) -> List[str]:
+        """
+        Captions for all crops; only cache misses are passed to the model.
+
+        generate(indices) must return one caption per index (crops[indices]); identical crops
+        within the batch are generated once.
+        """
+        keys = self.keys(crops, model_name, prompt, channels_first)
+        captions: List[Optional[str]] = [None] * len(keys)
+        pending: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            if key in pending:
+                pending[key].append(i)
+                continue
+            cached = self.get(key)
+            if cached is not None:
+                captions[i] = cached
+            else:
+                pending[key] = [i]
+
+        if pending:
+            first = [positions[0] for positions in pending.values()]
+            generated = list(generate(first))
+            self.put_many(dict(zip(pending, generated)))
+            for positions, text in zip(pending.values(), generated):
+                for i in positions:
+                    captions[i] = text
+        return captions
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Drop the in-memory entries (the disk tier is kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
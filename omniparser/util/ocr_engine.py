@@ -0,0 +1,184 @@
+"""
+OCR engine registry.
+
+Engines are created on first use and only one is kept resident: asking for a different
+engine releases the previous one. The heavy OCR packages are imported by the factories,
+so importing this module (or util.utils) does not load easyocr or paddleocr.
+"""
+import gc
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_OCR_ENGINE = 'easyocr'
+
+PADDLEOCR_ARGS = dict(
+    lang='en',  # other lang also available
+    use_angle_cls=False,
+    use_gpu=False,  # using cuda will conflict with pytorch in the same process
+    show_log=False,
+    max_batch_size=1024,
+    use_dilation=True,  # improves accuracy
+    det_db_score_mode='slow',  # improves accuracy
+    rec_batch_num=1024)
+
+
+def _create_easyocr():
+    import easyocr
+    return easyocr.Reader(['en'])
+
+
+def _read_easyocr(engine, image_np: np.ndarray, easyocr_args: Optional[dict]) -> Tuple[List, List[str]]:
+    if easyocr_args is None:
+        easyocr_args = {}
+    result = engine.readtext(image_np, **easyocr_args)
+    coord = [item[0] for item in result]
+    text = [item[1] for item in result]
+    return coord, text
+
+
+def _create_paddleocr():
+    from paddleocr import PaddleOCR
+    return PaddleOCR(**PADDLEOCR_ARGS)
+
+
+def _read_paddleocr(engine, image_np: np.ndarray, easyocr_args: Optional[dict]) -> Tuple[List, List[str]]:
+    if easyocr_args is None:
+        text_threshold = 0.5
+    else:
+        text_threshold = easyocr_args['text_threshold']
+    result = engine.ocr(image_np, cls=False)[0] or []
+    coord = [item[0] for item in result if item[1][1] > text_threshold]
+    text = [item[1][0] for item in result if item[1][1] > text_threshold]
+    return coord, text
+
+
+def sorted_boxes(dt_boxes) -> List[np.ndarray]:
+    """Sort quads top to bottom, left to right (same order as PaddleOCR's own pipeline)."""
+    _boxes = sorted(dt_boxes, key=lambda x: (x[0][1], x[0][0]))
+    for i in range(len(_boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(_boxes[j + 1][0][1] - _boxes[j][0][1]) < 10 and _boxes[j + 1][0][0] < _boxes[j][0][0]:
+                _boxes[j], _boxes[j + 1] = _boxes[j + 1], _boxes[j]
+            else:
+                break
+    return _boxes
+
+
+def get_rotate_crop_image(img: np.ndarray, points) -> np.ndarray:
+    """Perspective-crop a text quad to an upright rectangle (tall crops are rotated)."""
+    import cv2
+    points = np.asarray(points, dtype=np.float32)
+    crop_width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    crop_height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    pts_std = np.float32([[0, 0], [crop_width, 0], [crop_width, crop_height], [0, crop_height]])
+    M = cv2.getPerspectiveTransform(points, pts_std)
+    dst_img = cv2.warpPerspective(img, M, (crop_width, crop_height), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if dst_img.shape[0] * 1.0 / dst_img.shape[1] >= 1.5:
+        dst_img = np.rot90(dst_img)
+    return dst_img
+
+
+def _read_paddleocr_batch(engine, images: List[np.ndarray], easyocr_args: Optional[dict]) -> List[Tuple[List, List[str]]]:
+    """Detection per image, then one pooled recognition pass over the crops of all images."""
+    if easyocr_args is None:
+        text_threshold = 0.5
+    else:
+        text_threshold = easyocr_args['text_threshold']
+    drop_score = getattr(engine, 'drop_score', 0.5)
+
+    quads, crops, owners = [], [], []
+    for index, image_np in enumerate(images):
+        dt_boxes = engine.ocr(image_np, det=True, rec=False, cls=False)[0] or []
+        for quad in sorted_boxes(np.asarray(box, dtype=np.float32) for box in dt_boxes):
+            quads.append(quad.tolist())
+            crops.append(get_rotate_crop_image(image_np, quad))
+            owners.append(index)
+
+    results = [([], []) for _ in images]
+    if not crops:
+        return results
+    # a nested list is recognized as one input, so rec_batch_num applies to the pooled crops
+    rec_res = engine.ocr([crops], det=False, cls=False)[0]
+    for quad, owner, (text, score) in zip(quads, owners, rec_res):
+        if score >= drop_score and score > text_threshold:
+            results[owner][0].append(quad)
+            results[owner][1].append(text)
+    return results
+
+
+# name -> (factory() -> engine, read(engine, image_np, easyocr_args) -> (quads, texts))
+OCR_ENGINES: Dict[str, Tuple[Callable, Callable]] = {
+    'easyocr': (_create_easyocr, _read_easyocr),
+    'paddleocr': (_create_paddleocr, _read_paddleocr),
+}
+# name -> read_batch(engine, images, easyocr_args) -> [(quads, texts), ...]; engines without one are run per image
+OCR_BATCH_READERS: Dict[str, Callable] = {
+    'paddleocr': _read_paddleocr_batch,
+}
+
+_lock = threading.Lock()
+_resident = {'name': None, 'engine': None}
+
+
+def register_ocr_engine(name: str, factory: Callable, read: Callable, read_batch: Optional[Callable] = None):
+    """Register an engine: factory() builds it, read(engine, image_np, easyocr_args) returns (quads, texts),
+    optional read_batch(engine, images, easyocr_args) returns one (quads, texts) per image."""
+    OCR_ENGINES[name] = (factory, read)
+    if read_batch is not None:
+        OCR_BATCH_READERS[name] = read_batch
+    else:
+        OCR_BATCH_READERS.pop(name, None)
+
+
+def get_ocr_engine(name: Optional[str] = None):
+    """The resident engine `name`, created on first use (replacing any other resident engine)."""
+    name = name or DEFAULT_OCR_ENGINE
+    if name not in OCR_ENGINES:
+        raise ValueError(f"unknown OCR engine: {name}, expected one of {sorted(OCR_ENGINES)}")
+    with _lock:
+        if _resident['name'] != name:
+            _release()
+            _resident['engine'] = OCR_ENGINES[name][0]()
+            _resident['name'] = name
+        return _resident['engine']
+
+
+def run_ocr(image_np: np.ndarray, name: Optional[str] = None, easyocr_args: Optional[dict] = None) -> Tuple[List, List[str]]:
+    """OCR an RGB image with engine `name`; returns (quads, texts)."""
+    name = name or DEFAULT_OCR_ENGINE
+    engine = get_ocr_engine(name)
+    return OCR_ENGINES[name][1](engine, image_np, easyocr_args)
+
+
+def run_ocr_batch(images: List[np.ndarray], name: Optional[str] = None,
+                  easyocr_args: Optional[dict] = None) -> List[Tuple[List, List[str]]]:
+    """OCR several RGB images with engine `name`; returns one (quads, texts) per image."""
+    name = name or DEFAULT_OCR_ENGINE
+    engine = get_ocr_engine(name)
+    read_batch = OCR_BATCH_READERS.get(name)
+    if read_batch is not None:
+        return read_batch(engine, images, easyocr_args)
+    read = OCR_ENGINES[name][1]
+    return [read(engine, image_np, easyocr_args) for image_np in images]
+
+
+def _release():
+    if _resident['engine'] is None:
+        return
+    _resident['engine'] = None
+    _resident['name'] = None
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+def release_ocr_engine():
+    """Drop the resident engine (it is rebuilt on the next use)."""
+    with _lock:
+        _release()
@@ -1,4 +1,7 @@
-from util.utils import get_som_labeled_img, get_caption_model_processor, get_yolo_model, check_ocr_box
+from util.utils import get_som_labeled_img, get_caption_model_processor, get_yolo_model, check_ocr_box, caption_crops
+from util.caption_cache import CaptionCache
+from util.caption_batcher import CaptionBatcher
+import threading
 import torch
 from PIL import Image
 import io
@@ -9,11 +12,34 @@ class Omniparser(object):
         self.config = config
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
-        self.som_model = get_yolo_model(model_path=config['som_model_path'])
-        self.caption_model_processor = get_caption_model_processor(model_name=config['caption_model_name'], model_name_or_path=config['caption_model_path'], device=device)
+        # 'som_backend': 'torch' (Ultralytics) or 'onnx' (ONNX Runtime on CPU, threads from 'onnx_intra_op_threads' / 'onnx_inter_op_threads')
+        self.som_model = get_yolo_model(model_path=config['som_model_path'], backend=config.get('som_backend', 'torch'),
+                                        intra_op_threads=config.get('onnx_intra_op_threads', 0), inter_op_threads=config.get('onnx_inter_op_threads', 0))
+        self.caption_model_processor = get_caption_model_processor(model_name=config['caption_model_name'], model_name_or_path=config['caption_model_path'], device=device,
+                                                                   quantize=config.get('caption_quantize'))
+        # icon caption cache, off by default: 'caption_cache_size' entries in memory (0 disables), optional 'caption_cache_path' sqlite file.
+        # Lossy: crops are keyed by a perceptual hash, so visually near-identical but different icons share one caption.
+        self.caption_cache = None
+        if config.get('caption_cache_size', 0) > 0:
+            self.caption_cache = CaptionCache(max_entries=config['caption_cache_size'], path=config.get('caption_cache_path'))
+        # captioning shared by concurrent parse() calls: 'caption_max_wait' seconds (0 disables), 'caption_batch_size' crops per batch
+        self.caption_batcher = None
+        if config.get('caption_max_wait', 0) > 0:
+            batch_size = config.get('caption_batch_size', 128)
+            self.caption_batcher = CaptionBatcher(lambda crops, prompt: caption_crops(crops, self.caption_model_processor, prompt, batch_size),
+                                                  max_batch=batch_size, max_wait=config['caption_max_wait'])
+        # detection, OCR and (without the batcher) captioning are not shared between threads
+        self.model_lock = threading.Lock()
         print('Omniparser initialized!!!')
 
-    def parse(self, image_base64: str):
+    def parse(self, image_base64: str, render_som: bool = None):
+        """
+        config options: 'ocr_engine' ('easyocr' | 'paddleocr', created on first parse); 'render_som' (default True) - draw and encode the SOM image;
+        'som_encoding' ('png' | 'jpeg' | 'raw', default 'png') and 'som_quality' (JPEG quality, default 85).
+        With render_som=False the first return value is a SomRenderer; call .encode() when needed.
+        """
+        if render_som is None:
+            render_som = self.config.get('render_som', True)
         image_bytes = base64.b64decode(image_base64)
         image = Image.open(io.BytesIO(image_bytes))
         print('image size:', image.size)
@@ -26,7 +52,8 @@ class Omniparser(object):
             'thickness': max(int(3 * box_overlay_ratio), 1),
         }
 
-        (text, ocr_bbox), _ = check_ocr_box(image, display_img=False, output_bb_format='xyxy', easyocr_args={'text_threshold': 0.8}, use_paddleocr=False)
-        dino_labled_img, label_coordinates, parsed_content_list = get_som_labeled_img(image, self.som_model, BOX_TRESHOLD = self.config['BOX_TRESHOLD'], output_coord_in_ratio=True, ocr_bbox=ocr_bbox,draw_bbox_config=draw_bbox_config, caption_model_processor=self.caption_model_processor, ocr_text=text,use_local_semantics=True, iou_threshold=0.7, scale_img=False, batch_size=128)
+        with self.model_lock:
+            (text, ocr_bbox), _ = check_ocr_box(image, display_img=False, output_bb_format='xyxy', easyocr_args={'text_threshold': 0.8}, ocr_engine=self.config.get('ocr_engine', 'easyocr'))
+        dino_labled_img, label_coordinates, parsed_content_list = get_som_labeled_img(image, self.som_model, BOX_TRESHOLD = self.config['BOX_TRESHOLD'], output_coord_in_ratio=True, ocr_bbox=ocr_bbox,draw_bbox_config=draw_bbox_config, caption_model_processor=self.caption_model_processor, ocr_text=text,use_local_semantics=True, iou_threshold=0.7, scale_img=False, batch_size=128, render_som=render_som, som_encoding=self.config.get('som_encoding', 'png'), som_quality=self.config.get('som_quality', 85), caption_cache=self.caption_cache, caption_batcher=self.caption_batcher, model_lock=self.model_lock)
 
         return dino_labled_img, parsed_content_list
\ No newline at end of file
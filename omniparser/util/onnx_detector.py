@@ -0,0 +1,170 @@
+"""
+ONNX Runtime backend for the icon_detect YOLO model.
+
+The Ultralytics checkpoint is exported once to ONNX (dynamic input shape, next to the .pt file)
+and run with ONNX Runtime; letterboxing, NMS and box rescaling are done in NumPy so the CPU path
+needs neither torch nor ultralytics at inference time. Preprocessing and postprocessing follow
+Ultralytics' predictor, so boxes match model.predict within floating point tolerance.
+"""
+import ast
+import os
+from typing import List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def export_onnx(model_path: str, onnx_path: Optional[str] = None, opset: Optional[int] = None) -> str:
+    """
+    Export an Ultralytics checkpoint to ONNX unless an up-to-date export already exists.
+
+    Returns the path of the .onnx file (default: model_path with an .onnx suffix).
+    """
+    if onnx_path is None:
+        onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+    if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(model_path):
+        return onnx_path
+    from ultralytics import YOLO
+    exported = YOLO(model_path).export(format='onnx', dynamic=True, simplify=True, opset=opset)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+
+def letterbox(image: np.ndarray, new_shape: Tuple[int, int], stride: int = 32, auto: bool = True) -> np.ndarray:
+    """Resize keeping the aspect ratio and pad with gray (114) to new_shape (h, w); with auto, pad only to a stride multiple."""
+    h, w = image.shape[:2]
+    r = min(new_shape[0] / h, new_shape[1] / w)
+    new_unpad = (int(round(w * r)), int(round(h * r)))
+    dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
+    if auto:
+        dw, dh = np.mod(dw, stride), np.mod(dh, stride)
+    dw, dh = dw / 2, dh / 2
+    if (w, h) != new_unpad:
+        image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression on xyxy boxes; returns kept indices, highest score first."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def scale_boxes(boxes: np.ndarray, input_shape: Tuple[int, int], image_shape: Tuple[int, int]) -> np.ndarray:
+    """Map xyxy boxes from the letterboxed input (h, w) back to the original image (h, w), clipped."""
+    gain = min(input_shape[0] / image_shape[0], input_shape[1] / image_shape[1])
+    pad_x = round((input_shape[1] - image_shape[1] * gain) / 2 - 0.1)
+    pad_y = round((input_shape[0] - image_shape[0] * gain) / 2 - 0.1)
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] -= pad_x
+    boxes[:, [1, 3]] -= pad_y
+    boxes /= gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_shape[0])
+    return boxes
+
+
+def postprocess(output: np.ndarray, conf: float, iou: float, max_det: int = 300, max_nms: int = 30000) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode one YOLOv8 head output (4 + nc, anchors) into (xyxy boxes, scores) in input pixels.
+    Class-aware NMS, like Ultralytics' default (icon_detect has a single class).
+    """
+    pred = output.T
+    class_scores = pred[:, 4:]
+    classes = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(pred)), classes]
+    mask = scores > conf
+    xywh, scores, classes = pred[mask, :4], scores[mask], classes[mask]
+    if len(scores) > max_nms:
+        top = np.argsort(-scores, kind='stable')[:max_nms]
+        xywh, scores, classes = xywh[top], scores[top], classes[top]
+    boxes = np.empty_like(xywh)
+    boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+    # offset boxes per class so one NMS pass never suppresses across classes
+    offset = classes[:, None].astype(boxes.dtype) * 7680
+    keep = nms(boxes + offset, scores, iou)[:max_det]
+    return boxes[keep], scores[keep]
+
+
+class OnnxDetector:
+    """
+    YOLO detector on ONNX Runtime.
+
+    Attributes:
+        imgsz (Tuple[int, int]): default inference size (h, w) from the export metadata
+        stride (int): model stride
+        dynamic (bool): input accepts any stride-multiple size (letterbox pads only to the stride)
+    """
+
+    def __init__(self, onnx_path: str, intra_op_threads: int = 0, inter_op_threads: int = 0,
+                 providers: Optional[Sequence[str]] = None):
+        """
+        Args:
+            onnx_path: exported model (see export_onnx)
+            intra_op_threads: threads inside one operator (0 lets ONNX Runtime choose)
+            inter_op_threads: threads across independent operators (0 lets ONNX Runtime choose)
+            providers: execution providers, e.g. ['OpenVINOExecutionProvider'] (default CPU)
+        """
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=list(providers or ['CPUExecutionProvider']))
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.dynamic = not all(isinstance(d, int) for d in model_input.shape[2:])
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.stride = int(metadata.get('stride', 32))
+        imgsz = ast.literal_eval(metadata['imgsz']) if 'imgsz' in metadata else model_input.shape[2:]
+        self.imgsz = self._check_imgsz(imgsz)
+
+    def _check_imgsz(self, imgsz: Union[int, Sequence[int]]) -> Tuple[int, int]:
+        """(h, w) rounded up to stride multiples; a fixed-shape export always uses its own size."""
+        if not self.dynamic:
+            return tuple(self.session.get_inputs()[0].shape[2:])
+        if isinstance(imgsz, int):
+            imgsz = (imgsz, imgsz)
+        return tuple(int(np.ceil(s / self.stride) * self.stride) for s in imgsz)
+
+    def predict(self, image: Union[Image.Image, np.ndarray], conf: float = 0.25, iou: float = 0.7,
+                imgsz: Optional[Union[int, Sequence[int]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Detect boxes in an RGB image.
+
+        Returns:
+            (boxes, scores): (N, 4) float32 xyxy in image pixels and (N,) confidences, best first
+        """
+        image = np.asarray(image.convert('RGB') if isinstance(image, Image.Image) else image)
+        input_shape = self._check_imgsz(imgsz) if imgsz is not None else self.imgsz
+        padded = letterbox(image, input_shape, self.stride, auto=self.dynamic)
+        blob = np.ascontiguousarray(padded.transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+        output = self.session.run(None, {self.input_name: blob})[0][0]
+        boxes, scores = postprocess(output, conf, iou)
+        boxes = scale_boxes(boxes, padded.shape[:2], image.shape[:2])
+        return boxes.astype(np.float32), scores.astype(np.float32)
+
+
+def load_onnx_detector(model_path: str, intra_op_threads: int = 0, inter_op_threads: int = 0,
+                       providers: Optional[List[str]] = None) -> OnnxDetector:
+    """OnnxDetector for a .pt checkpoint (exported on first use) or an .onnx file."""
+    onnx_path = model_path if model_path.endswith('.onnx') else export_onnx(model_path)
+    return OnnxDetector(onnx_path, intra_op_threads, inter_op_threads, providers)
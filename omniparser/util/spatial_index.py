@@ -0,0 +1,166 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class GridIndex:
+    """
+    Uniform-grid spatial index over axis-aligned boxes.
+
+    Boxes are bucketed into square cells so point hit-tests, rectangle queries and
+    nearest-box lookups only look at the boxes near the query instead of all of them.
+    Boxes that would span too many cells (full-screen panels, backgrounds) are kept in
+    a separate list that every query checks directly.
+
+    Attributes:
+        boxes (np.ndarray): (N, 4) float64 array of x1, y1, x2, y2
+        cell_size (float): side of one grid cell, in box coordinates
+    """
+
+    MAX_CELLS_PER_BOX = 64
+
+    def __init__(self, boxes: Sequence[Sequence[float]], cell_size: Optional[float] = None):
+        """
+        Args:
+            boxes: boxes as x1, y1, x2, y2 (any coordinate unit, pixels or ratios)
+            cell_size: grid cell side; defaults to twice the median box side
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        widths = self.boxes[:, 2] - self.boxes[:, 0]
+        heights = self.boxes[:, 3] - self.boxes[:, 1]
+        self.areas = widths * heights
+
+        if cell_size is None:
+            sides = np.concatenate([widths, heights])
+            sides = sides[sides > 0]
+            cell_size = 2.0 * float(np.median(sides)) if len(sides) else 1.0
+        self.cell_size = cell_size
+
+        self._cells = {}
+        large = []
+        if len(self.boxes):
+            lo = np.floor(self.boxes[:, :2] / cell_size).astype(np.int64)
+            hi = np.floor(self.boxes[:, 2:] / cell_size).astype(np.int64)
+            spans = (hi - lo + 1).prod(axis=1)
+            for i in range(len(self.boxes)):
+                if spans[i] > self.MAX_CELLS_PER_BOX:
+                    large.append(i)
+                    continue
+                for cx in range(lo[i, 0], hi[i, 0] + 1):
+                    for cy in range(lo[i, 1], hi[i, 1] + 1):
+                        self._cells.setdefault((cx, cy), []).append(i)
+            self._extent = (lo.min(axis=0), hi.max(axis=0))
+        self._large = np.asarray(large, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(np.floor(x / self.cell_size)), int(np.floor(y / self.cell_size))
+
+    def _gather(self, cells) -> np.ndarray:
+        """Unique box indices registered in the given cells plus the large boxes."""
+        found = [self._large]
+        for cell in cells:
+            members = self._cells.get(cell)
+            if members:
+                found.append(np.asarray(members, dtype=np.int64))
+        return np.unique(np.concatenate(found))
+
+    def query_point(self, x: float, y: float) -> np.ndarray:
+        """
+        Boxes containing (x, y), edges included.
+
+        Returns:
+            np.ndarray: box indices, smallest (most specific) box first
+        """
+        if not len(self.boxes):
+            return np.zeros(0, dtype=np.int64)
+        candidates = self._gather([self._cell(x, y)])
+        b = self.boxes[candidates]
+        hits = candidates[(b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3])]
+        return hits[np.argsort(self.areas[hits], kind='stable')]
+
+    def query_rect(self, rect: Sequence[float], mode: str = 'intersects') -> np.ndarray:
+        """
+        Boxes overlapping or lying inside a rectangle.
+
+        Args:
+            rect: x1, y1, x2, y2
+            mode: 'intersects' (touching edges count) or 'within' (box fully inside rect)
+
+        Returns:
+            np.ndarray: box indices in ascending order
+        """
+        if not len(self.boxes):
+            return np.zeros(0, dtype=np.int64)
+        x1, y1, x2, y2 = rect
+        (cx1, cy1), (cx2, cy2) = self._cell(x1, y1), self._cell(x2, y2)
+        # clamp to the populated extent so huge query rectangles stay cheap
+        (ex1, ey1), (ex2, ey2) = self._extent
+        cx1, cy1, cx2, cy2 = max(cx1, ex1), max(cy1, ey1), min(cx2, ex2), min(cy2, ey2)
+        if cx1 > cx2 or cy1 > cy2:
+            candidates = self._large
+        elif (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self._cells):
+            candidates = np.arange(len(self.boxes))
+        else:
+            candidates = self._gather((cx, cy) for cx in range(cx1, cx2 + 1) for cy in range(cy1, cy2 + 1))
+
+        b = self.boxes[candidates]
+        if mode == 'within':
+            keep = (b[:, 0] >= x1) & (b[:, 1] >= y1) & (b[:, 2] <= x2) & (b[:, 3] <= y2)
+        elif mode == 'intersects':
+            keep = (b[:, 0] <= x2) & (b[:, 2] >= x1) & (b[:, 1] <= y2) & (b[:, 3] >= y1)
+        else:
+            raise ValueError(f"unknown mode: {mode}")
+        return candidates[keep]
+
+    def distances(self, x: float, y: float, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """Euclidean distance from (x, y) to each box (0 when inside)."""
+        b = self.boxes if indices is None else self.boxes[indices]
+        dx = np.maximum(np.maximum(b[:, 0] - x, x - b[:, 2]), 0)
+        dy = np.maximum(np.maximum(b[:, 1] - y, y - b[:, 3]), 0)
+        return np.hypot(dx, dy)
+
+    def nearest(self, x: float, y: float, k: int = 1,
+                max_distance: float = np.inf) -> List[Tuple[int, float]]:
+        """
+        The k boxes closest to (x, y), searching outward ring by ring.
+
+        Returns:
+            List[Tuple[int, float]]: (box index, distance), closest first; ties go to
+                the smaller box
+        """
+        if not len(self.boxes) or k <= 0:
+            return []
+        px, py = self._cell(x, y)
+        (ex1, ey1), (ex2, ey2) = self._extent
+        max_ring = max(px - ex1, ex2 - px, py - ey1, ey2 - py, 0)
+
+        seen = set(self._large.tolist())
+        ring = 0
+        while True:
+            if ring == 0:
+                cells = [(px, py)]
+            else:
+                cells = [(cx, cy) for cx in range(px - ring, px + ring + 1)
+                         for cy in (py - ring, py + ring)]
+                cells += [(cx, cy) for cx in (px - ring, px + ring)
+                          for cy in range(py - ring + 1, py + ring)]
+            for cell in cells:
+                seen.update(self._cells.get(cell, ()))
+
+            # anything not seen yet touches no cell within `ring`, so it is at least
+            # ring * cell_size away
+            bound = ring * self.cell_size
+            candidates = np.fromiter(seen, dtype=np.int64, count=len(seen))
+            dist = self.distances(x, y, candidates)
+            enough = np.count_nonzero(dist < bound) >= k
+            if enough or ring >= max_ring or bound > max_distance:
+                break
+            ring += 1
+
+        keep = dist <= max_distance
+        candidates, dist = candidates[keep], dist[keep]
+        order = np.lexsort((self.areas[candidates], dist))[:k]
+        return [(int(candidates[i]), float(dist[i])) for i in order]
@@ -5,48 +5,56 @@ import base64
 import time
 from PIL import Image, ImageDraw, ImageFont
 import json
-import requests
 # utility function
 import os
-from openai import AzureOpenAI
 
 import json
 import sys
 import os
 import cv2
 import numpy as np
-# %matplotlib inline
-from matplotlib import pyplot as plt
-import easyocr
-from paddleocr import PaddleOCR
-reader = easyocr.Reader(['en'])
-paddle_ocr = PaddleOCR(
-    lang='en',  # other lang also available
-    use_angle_cls=False,
-    use_gpu=False,  # using cuda will conflict with pytorch in the same process
-    show_log=False,
-    max_batch_size=1024,
-    use_dilation=True,  # improves accuracy
-    det_db_score_mode='slow',  # improves accuracy
-    rec_batch_num=1024)
+# OCR engines (easyocr / paddleocr) are created on first use, see util/ocr_engine.py
+from util.ocr_engine import get_ocr_engine, run_ocr, run_ocr_batch
 import time
 import base64
 
 import os
 import ast
+from contextlib import nullcontext
 import torch
 from typing import Tuple, List, Union
-from torchvision.ops import box_convert
+from torchvision.ops import box_convert, roi_align
 import re
 from torchvision.transforms import ToPILImage
 import supervision as sv
 import torchvision.transforms as T
 from util.box_annotator import BoxAnnotator 
+from util.spatial_index import GridIndex
+from util.onnx_detector import OnnxDetector, load_onnx_detector
 
 
-def get_caption_model_processor(model_name, model_name_or_path="Salesforce/blip2-opt-2.7b", device=None):
+CAPTION_QUANTIZE_MODES = ('int8', 'bf16')
+
+
+def quantize_caption_model(model, mode):
+    """
+    CPU-only reduced precision for the caption model.
+    'int8': dynamic INT8 quantization of every nn.Linear (weights int8, activations quantized per batch);
+    'bf16': all weights in bfloat16 (fast on CPUs with AVX512-BF16/AMX, emulated elsewhere).
+    """
+    if mode == 'int8':
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    if mode == 'bf16':
+        return model.to(torch.bfloat16)
+    raise ValueError(f"unknown quantize mode: {mode}, expected one of {CAPTION_QUANTIZE_MODES}")
+
+
+def get_caption_model_processor(model_name, model_name_or_path="Salesforce/blip2-opt-2.7b", device=None, quantize=None):
+    """quantize: None (float32 on cpu, float16 on cuda), 'int8' or 'bf16' (cpu only, see quantize_caption_model)"""
     if not device:
         device = "cuda" if torch.cuda.is_available() else "cpu"
+    if quantize and device != 'cpu':
+        raise ValueError(f"quantize={quantize} is only supported on cpu, got device={device}")
     if model_name == "blip2":
         from transformers import Blip2Processor, Blip2ForConditionalGeneration
         processor = Blip2Processor.from_pretrained("Salesforce/blip2-opt-2.7b")
@@ -65,42 +73,133 @@ def get_caption_model_processor(model_name, model_name_or_path="Salesforce/blip2
             model = AutoModelForCausalLM.from_pretrained(model_name_or_path, torch_dtype=torch.float32, trust_remote_code=True)
         else:
             model = AutoModelForCausalLM.from_pretrained(model_name_or_path, torch_dtype=torch.float16, trust_remote_code=True).to(device)
-    return {'model': model.to(device), 'processor': processor}
+    model = model.to(device)
+    if quantize:
+        model = quantize_caption_model(model.eval(), quantize)
+    return {'model': model, 'processor': processor, 'quantize': quantize}
 
 
-def get_yolo_model(model_path):
+def get_yolo_model(model_path, backend='torch', intra_op_threads=0, inter_op_threads=0, providers=None):
+    """
+    backend: 'torch' (Ultralytics) or 'onnx' (ONNX Runtime, util/onnx_detector.py; the .pt is exported
+    to .onnx on first use). intra_op_threads / inter_op_threads / providers only apply to 'onnx'.
+    """
+    if backend == 'onnx':
+        return load_onnx_detector(model_path, intra_op_threads, inter_op_threads, providers)
+    if backend != 'torch':
+        raise ValueError(f"unknown detector backend: {backend}, expected 'torch' or 'onnx'")
     from ultralytics import YOLO
     # Load the model.
     model = YOLO(model_path)
     return model
 
 
+def get_icon_crop_tensor(boxes, image_source, size=64):
+    """
+    Crop and resize every box in one roi_align call.
+
+    boxes: (N, 4) xyxy in ratio; image_source: HxWx3 uint8 RGB
+    Returns (crops, valid): float tensor (K, 3, size, size) in 0..255 for the K boxes with a
+    non-empty crop, and the (N,) bool mask of those boxes. Bilinear sampling with aligned=True
+    matches cv2.resize(crop, (size, size)) on the same integer crop window.
+    """
+    h, w = image_source.shape[:2]
+    boxes = torch.as_tensor(boxes, dtype=torch.float32).reshape(-1, 4).cpu()
+    # same integer crop window as int(coord * w) slicing
+    xmin = (boxes[:, 0] * w).long().clamp(0, w)
+    xmax = (boxes[:, 2] * w).long().clamp(0, w)
+    ymin = (boxes[:, 1] * h).long().clamp(0, h)
+    ymax = (boxes[:, 3] * h).long().clamp(0, h)
+    valid = (xmax > xmin) & (ymax > ymin)
+    if not valid.any():
+        return torch.zeros((0, 3, size, size)), valid
+
+    image = torch.from_numpy(np.ascontiguousarray(image_source)).permute(2, 0, 1)[None].float()
+    rois = torch.stack([torch.zeros(int(valid.sum())), xmin[valid].float(), ymin[valid].float(),
+                        xmax[valid].float(), ymax[valid].float()], dim=1)
+    crops = roi_align(image, rois, output_size=(size, size), spatial_scale=1.0, sampling_ratio=1, aligned=True)
+    return crops, valid
+
+
+def normalize_pixel_values(crops, image_processor, resize=True):
+    """Florence-style preprocessing on a (K, 3, H, W) 0..255 tensor: optional resize to the processor size, rescale, normalize."""
+    if resize:
+        size = image_processor.size
+        target = (size['height'], size['width']) if isinstance(size, dict) else (size, size)
+        crops = torch.nn.functional.interpolate(crops, size=target, mode='bicubic', align_corners=False).clamp_(0, 255)
+    mean = torch.tensor(image_processor.image_mean, dtype=crops.dtype).view(1, -1, 1, 1)
+    std = torch.tensor(image_processor.image_std, dtype=crops.dtype).view(1, -1, 1, 1)
+    return (crops * image_processor.rescale_factor - mean) / std
+
+
+def get_prompt_input_ids(processor, prompt):
+    """Token ids of the caption prompt (identical for every crop, so computed once)."""
+    dummy = Image.new('RGB', (64, 64))
+    return processor(images=[dummy], text=[prompt], return_tensors="pt", do_resize=False)["input_ids"]
+
+
 @torch.inference_mode()
-def get_parsed_content_icon(filtered_boxes, starting_idx, image_source, caption_model_processor, prompt=None, batch_size=128):
+def get_parsed_content_icon(filtered_boxes, starting_idx, image_source, caption_model_processor, prompt=None, batch_size=128, caption_cache=None, caption_batcher=None):
+    """
+    caption_cache: optional CaptionCache (util/caption_cache.py); only crops it has not seen go to the model
+    caption_batcher: optional CaptionBatcher (util/caption_batcher.py) shared by concurrent requests; the
+        crops are captioned in batches together with other requests' crops instead of directly
+    """
     # Number of samples per batch, --> 128 roughly takes 4 GB of GPU memory for florence v2 model
-    to_pil = ToPILImage()
     if starting_idx:
         non_ocr_boxes = filtered_boxes[starting_idx:]
     else:
         non_ocr_boxes = filtered_boxes
-    croped_pil_image = []
-    for i, coord in enumerate(non_ocr_boxes):
-        try:
-            xmin, xmax = int(coord[0]*image_source.shape[1]), int(coord[2]*image_source.shape[1])
-            ymin, ymax = int(coord[1]*image_source.shape[0]), int(coord[3]*image_source.shape[0])
-            cropped_image = image_source[ymin:ymax, xmin:xmax, :]
-            cropped_image = cv2.resize(cropped_image, (64, 64))
-            croped_pil_image.append(to_pil(cropped_image))
-        except:
-            continue
 
-    model, processor = caption_model_processor['model'], caption_model_processor['processor']
+    model = caption_model_processor['model']
     if not prompt:
         if 'florence' in model.config.name_or_path:
             prompt = "<CAPTION>"
         else:
             prompt = "The image shows"
-    
+
+    if 'florence' in model.config.name_or_path:
+        crops, _ = get_icon_crop_tensor(non_ocr_boxes, image_source, size=64)
+        channels_first = True
+    else:
+        crops = []
+        for i, coord in enumerate(non_ocr_boxes):
+            try:
+                xmin, xmax = int(coord[0]*image_source.shape[1]), int(coord[2]*image_source.shape[1])
+                ymin, ymax = int(coord[1]*image_source.shape[0]), int(coord[3]*image_source.shape[0])
+                cropped_image = image_source[ymin:ymax, xmin:xmax, :]
+                crops.append(cv2.resize(cropped_image, (64, 64)))
+            except:
+                continue
+        crops = np.stack(crops) if crops else np.zeros((0, 64, 64, 3), dtype=np.uint8)
+        channels_first = False
+
+    if caption_batcher is not None:
+        generate = lambda indices: caption_batcher.caption(crops[indices], prompt)
+    else:
+        generate = lambda indices: caption_crops(crops[indices], caption_model_processor, prompt, batch_size)
+
+    if caption_cache is None:
+        return generate(list(range(len(crops))))
+    # quantized models may caption differently, so they get their own cache entries
+    model_name = model.config.name_or_path
+    if caption_model_processor.get('quantize'):
+        model_name += '@' + caption_model_processor['quantize']
+    return caption_cache.caption(crops, model_name, prompt, generate, channels_first=channels_first)
+
+
+def caption_crops(crops, caption_model_processor, prompt, batch_size=128):
+    """Captions for crops from get_parsed_content_icon: (K, 3, 64, 64) tensor for Florence, (K, 64, 64, 3) uint8 otherwise."""
+    model, processor = caption_model_processor['model'], caption_model_processor['processor']
+    if 'florence' in model.config.name_or_path:
+        return get_parsed_content_icon_florence(crops, model, processor, prompt, batch_size)
+    return get_parsed_content_icon_pil(crops, model, processor, prompt, batch_size)
+
+
+def get_parsed_content_icon_pil(crops, model, processor, prompt, batch_size=128):
+    """Captioning through the processor's PIL path (BLIP-2 and other non-Florence models)."""
+    to_pil = ToPILImage()
+    croped_pil_image = [to_pil(crop) for crop in crops]
     generated_texts = []
     device = model.device
     for i in range(0, len(croped_pil_image), batch_size):
@@ -110,11 +209,8 @@ def get_parsed_content_icon(filtered_boxes, starting_idx, image_source, caption_
         if model.device.type == 'cuda':
             inputs = processor(images=batch, text=[prompt]*len(batch), return_tensors="pt", do_resize=False).to(device=device, dtype=torch.float16)
         else:
-            inputs = processor(images=batch, text=[prompt]*len(batch), return_tensors="pt").to(device=device)
-        if 'florence' in model.config.name_or_path:
-            generated_ids = model.generate(input_ids=inputs["input_ids"],pixel_values=inputs["pixel_values"],max_new_tokens=20,num_beams=1, do_sample=False)
-        else:
-            generated_ids = model.generate(**inputs, max_length=100, num_beams=5, no_repeat_ngram_size=2, early_stopping=True, num_return_sequences=1) # temperature=0.01, do_sample=True,
+            inputs = processor(images=batch, text=[prompt]*len(batch), return_tensors="pt").to(device=device, dtype=model.dtype)
+        generated_ids = model.generate(**inputs, max_length=100, num_beams=5, no_repeat_ngram_size=2, early_stopping=True, num_return_sequences=1) # temperature=0.01, do_sample=True,
         generated_text = processor.batch_decode(generated_ids, skip_special_tokens=True)
         generated_text = [gen.strip() for gen in generated_text]
         generated_texts.extend(generated_text)
@@ -122,6 +218,24 @@ def get_parsed_content_icon(filtered_boxes, starting_idx, image_source, caption_
     return generated_texts
 
 
+def get_parsed_content_icon_florence(crops, model, processor, prompt, batch_size=128):
+    """Florence captioning of (K, 3, 64, 64) 0..255 crops: normalize -> generate, no PIL round trip."""
+    input_ids = get_prompt_input_ids(processor, prompt)
+
+    device = model.device
+    # as before: crops stay 64x64 on cuda (do_resize=False), the processor size is used on cpu
+    resize = device.type != 'cuda'
+    dtype = torch.float16 if device.type == 'cuda' else model.dtype
+    generated_texts = []
+    for i in range(0, len(crops), batch_size):
+        batch = crops[i:i+batch_size]
+        pixel_values = normalize_pixel_values(batch, processor.image_processor, resize=resize).to(device=device, dtype=dtype)
+        batch_input_ids = input_ids.expand(len(batch), -1).to(device)
+        generated_ids = model.generate(input_ids=batch_input_ids, pixel_values=pixel_values, max_new_tokens=20, num_beams=1, do_sample=False)
+        generated_text = processor.batch_decode(generated_ids, skip_special_tokens=True)
+        generated_texts.extend(gen.strip() for gen in generated_text)
+    return generated_texts
+
 
 def get_parsed_content_icon_phi3v(filtered_boxes, ocr_bbox, image_source, caption_model_processor):
     to_pil = ToPILImage()
@@ -205,6 +319,9 @@ def remove_overlap(boxes, iou_threshold, ocr_bbox=None):
         return ratio1 > 0.95
 
     boxes = boxes.tolist()
+    # IoU > iou_threshold >= 0 needs a non-empty intersection, so only boxes sharing grid cells can conflict
+    box_index = GridIndex(boxes) if iou_threshold >= 0 else None
+    ocr_index = GridIndex(ocr_bbox) if ocr_bbox and iou_threshold >= 0 else None
     filtered_boxes = []
     if ocr_bbox:
         filtered_boxes.extend(ocr_bbox)
@@ -212,7 +329,9 @@ def remove_overlap(boxes, iou_threshold, ocr_bbox=None):
     for i, box1 in enumerate(boxes):
         # if not any(IoU(box1, box2) > iou_threshold and box_area(box1) > box_area(box2) for j, box2 in enumerate(boxes) if i != j):
         is_valid_box = True
-        for j, box2 in enumerate(boxes):
+        neighbours = box_index.query_rect(box1) if box_index is not None else range(len(boxes))
+        for j in neighbours:
+            box2 = boxes[j]
             # keep the smaller box
             if i != j and IoU(box1, box2) > iou_threshold and box_area(box1) > box_area(box2):
                 is_valid_box = False
@@ -221,7 +340,8 @@ def remove_overlap(boxes, iou_threshold, ocr_bbox=None):
             # add the following 2 lines to include ocr bbox
             if ocr_bbox:
                 # only add the box if it does not overlap with any ocr bbox
-                if not any(IoU(box1, box3) > iou_threshold and not is_inside(box1, box3) for k, box3 in enumerate(ocr_bbox)):
+                ocr_neighbours = ocr_index.query_rect(box1) if ocr_index is not None else range(len(ocr_bbox))
+                if not any(IoU(box1, ocr_bbox[k]) > iou_threshold and not is_inside(box1, ocr_bbox[k]) for k in ocr_neighbours):
                     filtered_boxes.append(box1)
             else:
                 filtered_boxes.append(box1)
@@ -233,80 +353,77 @@ def remove_overlap_new(boxes, iou_threshold, ocr_bbox=None):
     ocr_bbox format: [{'type': 'text', 'bbox':[x,y], 'interactivity':False, 'content':str }, ...]
     boxes format: [{'type': 'icon', 'bbox':[x,y], 'interactivity':True, 'content':None }, ...]
 
+    Pairwise IoU / containment is computed as NxN (icons) and NxM (icons x ocr) matrices.
+    Output matches the original double loop: remaining ocr entries first (in order), then
+    the kept icons, with ocr text inside an icon merged into its content.
     '''
     assert ocr_bbox is None or isinstance(ocr_bbox, List)
 
-    def box_area(box):
-        return (box[2] - box[0]) * (box[3] - box[1])
-
-    def intersection_area(box1, box2):
-        x1 = max(box1[0], box2[0])
-        y1 = max(box1[1], box2[1])
-        x2 = min(box1[2], box2[2])
-        y2 = min(box1[3], box2[3])
-        return max(0, x2 - x1) * max(0, y2 - y1)
-
-    def IoU(box1, box2):
-        intersection = intersection_area(box1, box2)
-        union = box_area(box1) + box_area(box2) - intersection + 1e-6
-        if box_area(box1) > 0 and box_area(box2) > 0:
-            ratio1 = intersection / box_area(box1)
-            ratio2 = intersection / box_area(box2)
+    def as_array(elems):
+        return np.asarray([elem['bbox'] for elem in elems], dtype=np.float64).reshape(-1, 4)
+
+    def box_area(b):
+        return (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+
+    def intersection_area(b1, b2):
+        x1 = np.maximum(b1[:, None, 0], b2[None, :, 0])
+        y1 = np.maximum(b1[:, None, 1], b2[None, :, 1])
+        x2 = np.minimum(b1[:, None, 2], b2[None, :, 2])
+        y2 = np.minimum(b1[:, None, 3], b2[None, :, 3])
+        return np.maximum(0, x2 - x1) * np.maximum(0, y2 - y1)
+
+    def inside_ratio(intersection, area):
+        # intersection / area of the "inner" box, broadcast over the other axis
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(area > 0, intersection / np.where(area > 0, area, 1), 0)
+
+    # keep the smaller box of every overlapping icon pair
+    icon_boxes = as_array(boxes)
+    areas = box_area(icon_boxes)
+    inter = intersection_area(icon_boxes, icon_boxes)
+    union = areas[:, None] + areas[None, :] - inter + 1e-6
+    both_positive = (areas[:, None] > 0) & (areas[None, :] > 0)
+    ratio1 = np.where(both_positive, inside_ratio(inter, areas[:, None]), 0)
+    ratio2 = np.where(both_positive, inside_ratio(inter, areas[None, :]), 0)
+    iou = np.maximum(np.maximum(inter / union, ratio1), ratio2)
+    conflict = (iou > iou_threshold) & (areas[:, None] > areas[None, :])
+    np.fill_diagonal(conflict, False)
+    valid = np.flatnonzero(~conflict.any(axis=1))
+
+    if not ocr_bbox:
+        return [boxes[i]['bbox'] for i in valid]
+
+    ocr_boxes = as_array(ocr_bbox)
+    inter = intersection_area(icon_boxes[valid], ocr_boxes)
+    ocr_in_icon = inside_ratio(inter, box_area(ocr_boxes)[None, :]) > 0.80
+    icon_in_ocr = inside_ratio(inter, areas[valid][:, None]) > 0.80
+    # the scan over ocr boxes stops at the first one that contains the icon (checked only
+    # when that ocr box is not itself inside the icon)
+    stops = icon_in_ocr & ~ocr_in_icon
+    has_stop = stops.any(axis=1)
+    stop_at = np.where(has_stop, stops.argmax(axis=1), len(ocr_bbox))
+    gathered = ocr_in_icon & (np.arange(len(ocr_bbox))[None, :] < stop_at[:, None])
+
+    remaining = list(ocr_bbox)
+    icons = []
+    for row, i in enumerate(valid):
+        # gather all ocr labels inside the icon and drop those ocr entries
+        ocr_labels = ''
+        for k in np.flatnonzero(gathered[row]):
+            box3_elem = ocr_bbox[k]
+            try:
+                ocr_labels += box3_elem['content'] + ' '
+                remaining.remove(box3_elem)
+            except:
+                continue
+        if has_stop[row]:
+            # icon inside ocr, don't add this icon box
+            continue
+        if ocr_labels:
+            icons.append({'type': 'icon', 'bbox': boxes[i]['bbox'], 'interactivity': True, 'content': ocr_labels, 'source':'box_yolo_content_ocr'})
         else:
-            ratio1, ratio2 = 0, 0
-        return max(intersection / union, ratio1, ratio2)
-
-    def is_inside(box1, box2):
-        # return box1[0] >= box2[0] and box1[1] >= box2[1] and box1[2] <= box2[2] and box1[3] <= box2[3]
-        intersection = intersection_area(box1, box2)
-        ratio1 = intersection / box_area(box1)
-        return ratio1 > 0.80
-
-    # boxes = boxes.tolist()
-    filtered_boxes = []
-    if ocr_bbox:
-        filtered_boxes.extend(ocr_bbox)
-    # print('ocr_bbox!!!', ocr_bbox)
-    for i, box1_elem in enumerate(boxes):
-        box1 = box1_elem['bbox']
-        is_valid_box = True
-        for j, box2_elem in enumerate(boxes):
-            # keep the smaller box
-            box2 = box2_elem['bbox']
-            if i != j and IoU(box1, box2) > iou_threshold and box_area(box1) > box_area(box2):
-                is_valid_box = False
-                break
-        if is_valid_box:
-            if ocr_bbox:
-                # keep yolo boxes + prioritize ocr label
-                box_added = False
-                ocr_labels = ''
-                for box3_elem in ocr_bbox:
-                    if not box_added:
-                        box3 = box3_elem['bbox']
-                        if is_inside(box3, box1): # ocr inside icon
-                            # box_added = True
-                            # delete the box3_elem from ocr_bbox
-                            try:
-                                # gather all ocr labels
-                                ocr_labels += box3_elem['content'] + ' '
-                                filtered_boxes.remove(box3_elem)
-                            except:
-                                continue
-                            # break
-                        elif is_inside(box1, box3): # icon inside ocr, don't added this icon box, no need to check other ocr bbox bc no overlap between ocr bbox, icon can only be in one ocr box
-                            box_added = True
-                            break
-                        else:
-                            continue
-                if not box_added:
-                    if ocr_labels:
-                        filtered_boxes.append({'type': 'icon', 'bbox': box1_elem['bbox'], 'interactivity': True, 'content': ocr_labels, 'source':'box_yolo_content_ocr'})
-                    else:
-                        filtered_boxes.append({'type': 'icon', 'bbox': box1_elem['bbox'], 'interactivity': True, 'content': None, 'source':'box_yolo_content_yolo'})
-            else:
-                filtered_boxes.append(box1)
-    return filtered_boxes # torch.tensor(filtered_boxes)
+            icons.append({'type': 'icon', 'bbox': boxes[i]['bbox'], 'interactivity': True, 'content': None, 'source':'box_yolo_content_yolo'})
+    return remaining + icons # torch.tensor(filtered_boxes)
 
 
 def load_image(image_path: str) -> Tuple[np.array, torch.Tensor]:
@@ -341,7 +458,6 @@ def annotate(image_source: np.ndarray, boxes: torch.Tensor, logits: torch.Tensor
     h, w, _ = image_source.shape
     boxes = boxes * torch.Tensor([w, h, w, h])
     xyxy = box_convert(boxes=boxes, in_fmt="cxcywh", out_fmt="xyxy").numpy()
-    xywh = box_convert(boxes=boxes, in_fmt="cxcywh", out_fmt="xywh").numpy()
     detections = sv.Detections(xyxy=xyxy)
 
     labels = [f"{phrase}" for phrase in range(boxes.shape[0])]
@@ -350,10 +466,65 @@ def annotate(image_source: np.ndarray, boxes: torch.Tensor, logits: torch.Tensor
     annotated_frame = image_source.copy()
     annotated_frame = box_annotator.annotate(scene=annotated_frame, detections=detections, labels=labels, image_size=(w,h))
 
-    label_coordinates = {f"{phrase}": v for phrase, v in zip(phrases, xywh)}
+    label_coordinates = get_label_coordinates(boxes, phrases)
     return annotated_frame, label_coordinates
 
 
+def get_label_coordinates(boxes: torch.Tensor, phrases: List[str]) -> dict:
+    """label -> xywh box, for boxes in cxcywh format, pixel scale"""
+    xywh = box_convert(boxes=boxes, in_fmt="cxcywh", out_fmt="xywh").numpy()
+    return {f"{phrase}": v for phrase, v in zip(phrases, xywh)}
+
+
+SOM_ENCODINGS = ('png', 'jpeg', 'raw')
+
+
+def encode_som_image(annotated_frame: np.ndarray, encoding: str = 'png', quality: int = 85):
+    """
+    Encode an annotated RGB frame.
+
+    encoding: 'png' or 'jpeg' -> base64 str (jpeg uses `quality`), 'raw' -> the RGB array itself
+    """
+    if encoding == 'raw':
+        return annotated_frame
+    if encoding not in SOM_ENCODINGS:
+        raise ValueError(f"unknown SOM encoding: {encoding}, expected one of {SOM_ENCODINGS}")
+    pil_img = Image.fromarray(annotated_frame)
+    buffered = io.BytesIO()
+    if encoding == 'jpeg':
+        pil_img.save(buffered, format="JPEG", quality=quality)
+    else:
+        pil_img.save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue()).decode('ascii')
+
+
+class SomRenderer:
+    """
+    Deferred set-of-marks rendering for get_som_labeled_img(render_som=False).
+
+    The boxes are only drawn the first time an image is requested; the annotated frame is
+    kept so asking for several encodings draws once.
+    """
+
+    def __init__(self, image_source: np.ndarray, boxes: torch.Tensor, logits, phrases: List[str], draw_kwargs: dict):
+        self.image_source = image_source
+        self.boxes = boxes
+        self.logits = logits
+        self.phrases = phrases
+        self.draw_kwargs = draw_kwargs
+        self._frame = None
+
+    def frame(self) -> np.ndarray:
+        """The annotated RGB frame."""
+        if self._frame is None:
+            self._frame, _ = annotate(image_source=self.image_source, boxes=self.boxes, logits=self.logits, phrases=self.phrases, **self.draw_kwargs)
+        return self._frame
+
+    def encode(self, encoding: str = 'png', quality: int = 85):
+        """The annotated frame as base64 'png'/'jpeg' or the 'raw' array."""
+        return encode_som_image(self.frame(), encoding, quality)
+
+
 def predict(model, image, caption, box_threshold, text_threshold):
     """ Use huggingface model to replace the original model
     """
@@ -379,6 +550,10 @@ def predict_yolo(model, image, box_threshold, imgsz, scale_img, iou_threshold=0.
     """ Use huggingface model to replace the original model
     """
     # model = model['model']
+    if isinstance(model, OnnxDetector):
+        boxes, conf = model.predict(image, conf=box_threshold, iou=iou_threshold, imgsz=imgsz if scale_img else None)
+        boxes, conf = torch.from_numpy(boxes), torch.from_numpy(conf)
+        return boxes, conf, [str(i) for i in range(len(boxes))]
     if scale_img:
         result = model.predict(
         source=image,
@@ -404,12 +579,20 @@ def int_box_area(box, w, h):
     area = (int_box[2] - int_box[0]) * (int_box[3] - int_box[1])
     return area
 
-def get_som_labeled_img(image_source: Union[str, Image.Image], model=None, BOX_TRESHOLD=0.01, output_coord_in_ratio=False, ocr_bbox=None, text_scale=0.4, text_padding=5, draw_bbox_config=None, caption_model_processor=None, ocr_text=[], use_local_semantics=True, iou_threshold=0.9,prompt=None, scale_img=False, imgsz=None, batch_size=128):
+def get_som_labeled_img(image_source: Union[str, Image.Image], model=None, BOX_TRESHOLD=0.01, output_coord_in_ratio=False, ocr_bbox=None, text_scale=0.4, text_padding=5, draw_bbox_config=None, caption_model_processor=None, ocr_text=[], use_local_semantics=True, iou_threshold=0.9,prompt=None, scale_img=False, imgsz=None, batch_size=128, render_som=True, som_encoding='png', som_quality=85, caption_cache=None, caption_batcher=None, model_lock=None):
     """Process either an image path or Image object
     
     Args:
         image_source: Either a file path (str) or PIL Image object
         ...
+        render_som: if False, skip drawing/encoding the SOM image and return a SomRenderer
+            in its place; call .encode(...) on it only when the image is needed
+        som_encoding: 'png' (base64), 'jpeg' (base64, som_quality) or 'raw' (RGB np.ndarray)
+        som_quality: JPEG quality
+        caption_cache: optional CaptionCache shared across calls (icon captions are reused for identical crops)
+        caption_batcher: optional CaptionBatcher to caption together with concurrent calls
+        model_lock: optional lock held around YOLO detection, and around captioning unless a caption_batcher
+            (which runs the caption model on its own single thread) is given, when calls run in parallel threads
     """
     if isinstance(image_source, str):
         image_source = Image.open(image_source)
@@ -418,7 +601,8 @@ def get_som_labeled_img(image_source: Union[str, Image.Image], model=None, BOX_T
     if not imgsz:
         imgsz = (h, w)
     # print('image size:', w, h)
-    xyxy, logits, phrases = predict_yolo(model=model, image=image_source, box_threshold=BOX_TRESHOLD, imgsz=imgsz, scale_img=scale_img, iou_threshold=0.1)
+    with model_lock or nullcontext():
+        xyxy, logits, phrases = predict_yolo(model=model, image=image_source, box_threshold=BOX_TRESHOLD, imgsz=imgsz, scale_img=scale_img, iou_threshold=0.1)
     xyxy = xyxy / torch.Tensor([w, h, w, h]).to(xyxy.device)
     image_source = np.asarray(image_source)
     phrases = [str(i) for i in range(len(phrases))]
@@ -447,9 +631,12 @@ def get_som_labeled_img(image_source: Union[str, Image.Image], model=None, BOX_T
     if use_local_semantics:
         caption_model = caption_model_processor['model']
         if 'phi3_v' in caption_model.config.model_type: 
-            parsed_content_icon = get_parsed_content_icon_phi3v(filtered_boxes, ocr_bbox, image_source, caption_model_processor)
+            with model_lock or nullcontext():
+                parsed_content_icon = get_parsed_content_icon_phi3v(filtered_boxes, ocr_bbox, image_source, caption_model_processor)
         else:
-            parsed_content_icon = get_parsed_content_icon(filtered_boxes, starting_idx, image_source, caption_model_processor, prompt=prompt,batch_size=batch_size)
+            # without a batcher each call runs generate() itself, so concurrent calls take turns on the shared model
+            with (model_lock if caption_batcher is None else None) or nullcontext():
+                parsed_content_icon = get_parsed_content_icon(filtered_boxes, starting_idx, image_source, caption_model_processor, prompt=prompt,batch_size=batch_size, caption_cache=caption_cache, caption_batcher=caption_batcher)
         ocr_text = [f"Text Box ID {i}: {txt}" for i, txt in enumerate(ocr_text)]
         icon_start = len(ocr_text)
         parsed_content_icon_ls = []
@@ -470,18 +657,16 @@ def get_som_labeled_img(image_source: Union[str, Image.Image], model=None, BOX_T
     phrases = [i for i in range(len(filtered_boxes))]
     
     # draw boxes
-    if draw_bbox_config:
-        annotated_frame, label_coordinates = annotate(image_source=image_source, boxes=filtered_boxes, logits=logits, phrases=phrases, **draw_bbox_config)
+    draw_kwargs = draw_bbox_config if draw_bbox_config else {'text_scale': text_scale, 'text_padding': text_padding}
+    renderer = SomRenderer(image_source, filtered_boxes, logits, phrases, draw_kwargs)
+    if render_som:
+        encoded_image = renderer.encode(som_encoding, som_quality)
     else:
-        annotated_frame, label_coordinates = annotate(image_source=image_source, boxes=filtered_boxes, logits=logits, phrases=phrases, text_scale=text_scale, text_padding=text_padding)
-    
-    pil_img = Image.fromarray(annotated_frame)
-    buffered = io.BytesIO()
-    pil_img.save(buffered, format="PNG")
-    encoded_image = base64.b64encode(buffered.getvalue()).decode('ascii')
+        encoded_image = renderer
+    label_coordinates = get_label_coordinates(filtered_boxes * torch.Tensor([w, h, w, h]), phrases)
     if output_coord_in_ratio:
         label_coordinates = {k: [v[0]/w, v[1]/h, v[2]/w, v[3]/h] for k, v in label_coordinates.items()}
-        assert w == annotated_frame.shape[1] and h == annotated_frame.shape[0]
+        assert w == image_source.shape[1] and h == image_source.shape[0]
 
     return encoded_image, label_coordinates, filtered_boxes_elem
 
@@ -501,29 +686,56 @@ def get_xywh_yolo(input):
     x, y, w, h = int(x), int(y), int(w), int(h)
     return x, y, w, h
 
-def check_ocr_box(image_source: Union[str, Image.Image], display_img = True, output_bb_format='xywh', goal_filtering=None, easyocr_args=None, use_paddleocr=False):
+def __getattr__(name):
+    # backwards compatibility for the former module-level engines
+    if name == 'reader':
+        return get_ocr_engine('easyocr')
+    if name == 'paddle_ocr':
+        return get_ocr_engine('paddleocr')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load_ocr_image(image_source: Union[str, Image.Image, np.ndarray]) -> np.ndarray:
+    """RGB array for OCR from a path, PIL image or RGB array (crop)"""
+    if isinstance(image_source, np.ndarray):
+        return image_source
     if isinstance(image_source, str):
         image_source = Image.open(image_source)
     if image_source.mode == 'RGBA':
         # Convert RGBA to RGB to avoid alpha channel issues
         image_source = image_source.convert('RGB')
-    image_np = np.array(image_source)
-    w, h = image_source.size
-    if use_paddleocr:
-        if easyocr_args is None:
-            text_threshold = 0.5
-        else:
-            text_threshold = easyocr_args['text_threshold']
-        result = paddle_ocr.ocr(image_np, cls=False)[0]
-        coord = [item[0] for item in result if item[1][1] > text_threshold]
-        text = [item[1][0] for item in result if item[1][1] > text_threshold]
-    else:  # EasyOCR
-        if easyocr_args is None:
-            easyocr_args = {}
-        result = reader.readtext(image_np, **easyocr_args)
-        coord = [item[0] for item in result]
-        text = [item[1] for item in result]
+    return np.array(image_source)
+
+
+def check_ocr_boxes(image_sources: List[Union[str, Image.Image, np.ndarray]], output_bb_format='xywh', easyocr_args=None, use_paddleocr=False, ocr_engine=None):
+    """
+    Batched check_ocr_box for many images or crops.
+
+    PaddleOCR runs detection per image and recognizes the text crops of all images in pooled
+    batches; other engines run image by image.
+    Returns [(text, bb), ...], one entry per input in the same format as check_ocr_box.
+    """
+    images = [load_ocr_image(image_source) for image_source in image_sources]
+    if ocr_engine is None:
+        ocr_engine = 'paddleocr' if use_paddleocr else 'easyocr'
+    results = []
+    for coord, text in run_ocr_batch(images, ocr_engine, easyocr_args):
+        if output_bb_format == 'xywh':
+            bb = [get_xywh(item) for item in coord]
+        elif output_bb_format == 'xyxy':
+            bb = [get_xyxy(item) for item in coord]
+        results.append((text, bb))
+    return results
+
+
+def check_ocr_box(image_source: Union[str, Image.Image], display_img = True, output_bb_format='xywh', goal_filtering=None, easyocr_args=None, use_paddleocr=False, ocr_engine=None):
+    """ocr_engine: registered engine name (see util/ocr_engine.py), overrides use_paddleocr"""
+    image_np = load_ocr_image(image_source)
+    if ocr_engine is None:
+        ocr_engine = 'paddleocr' if use_paddleocr else 'easyocr'
+    coord, text = run_ocr(image_np, ocr_engine, easyocr_args)
     if display_img:
+        from matplotlib import pyplot as plt
         opencv_img = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
         bb = []
         for item in coord:
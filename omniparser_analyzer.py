@@ -5,10 +5,16 @@ import cv2
 import numpy as np
 from PIL import Image
 import time
-from typing import Dict, List, Any, Tuple
+from typing import Callable, Dict, List, Any, Optional, Tuple, Union
 import logging
 import os
 import sys
+import threading
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from element_table import ElementTable
+from text_index import get_text_index
 
 logger = logging.getLogger(__name__)
 
@@ -17,24 +23,81 @@ OMNIPARSER_PATH = os.path.join(os.path.dirname(__file__), 'omniparser')
 if os.path.exists(OMNIPARSER_PATH):
     sys.path.insert(0, OMNIPARSER_PATH)
 
+from util.spatial_index import GridIndex
+
+# 프레임 지문(축소 그레이스케일) 크기와 비교 타일 크기
+# 1080p 기준 지문 한 픽셀이 4x4 화면 픽셀이라 글자 몇 개, 체크박스 하나의 변화도 드러남
+FINGERPRINT_SIZE = (480, 270)  # (width, height)
+FINGERPRINT_TILE = 30          # 타일 한 변 (지문 픽셀 단위, 1080p 기준 120px)
+
+
+def get_spatial_index(analysis: Dict[str, Any]) -> GridIndex:
+    """
+    분석 결과 요소 bbox의 격자 공간 색인 (처음 호출 시 만들어 analysis['spatial_index']에 보관)
+    
+    요소 목록이 바뀌면(증분 분석 등) 다시 만듭니다.
+    """
+    elements = analysis.get('elements', [])
+    cached = analysis.get('spatial_index')
+    if cached is not None and cached[0] is elements:
+        return cached[1]
+    
+    if isinstance(elements, ElementTable):
+        boxes = elements.bboxes
+    else:
+        boxes = [element.get('bbox', (0, 0, 0, 0)) for element in elements]
+    index = GridIndex(boxes)
+    analysis['spatial_index'] = (elements, index)
+    return index
+
 
 class ScreenAnalyzer:
     """OmniParser V2를 이용한 실시간 화면 분석"""
     
-    def __init__(self, model_name: str = "omniparser_v2", use_demo_mode: bool = False):
+    def __init__(self, model_name: str = "omniparser_v2", use_demo_mode: bool = False,
+                 cache_tolerance: float = 12.0, cache_ttl: float = 5.0,
+                 incremental: bool = False, incremental_max_ratio: float = 0.4,
+                 max_workers: int = 1, columnar: bool = False):
         """
         ScreenAnalyzer 초기화
         
         Args:
             model_name: 사용할 모델 이름
             use_demo_mode: True인 경우 더미 데이터 반환
+            cache_tolerance: 화면이 같다고 볼 지문 픽셀별 밝기 차이 상한 (0~255, 캡처 노이즈보다 크게)
+            cache_ttl: 캐시된 분석 결과 유효 시간 (초), 0이면 캐시 사용 안 함
+            incremental: True면 바뀐 영역만 다시 분석해 이전 결과에 병합
+            incremental_max_ratio: 바뀐 영역이 화면의 이 비율을 넘으면 전체 분석
+            max_workers: submit()으로 동시에 분석할 최대 프레임 수
+            columnar: True면 'elements'를 ElementTable(NumPy 열 기반)로 반환
         """
         self.model_name = model_name
         self.model = None
         self.processor = None
         self.device = None
         self.last_analysis_time = 0
-        self.analysis_cache = {}
+        self.analysis_cache = {}  # {'fingerprint', 'result', 'timestamp'}
+        self.cache_tolerance = cache_tolerance
+        self.cache_ttl = cache_ttl
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.incremental = incremental
+        self.incremental_max_ratio = incremental_max_ratio
+        self._next_element_id = 0
+        self._state_lock = threading.Lock()  # 캐시/요소 ID 갱신 보호
+        
+        # 비동기 분석 (submit)
+        self.max_workers = max(1, max_workers)
+        self.dropped_frames = 0
+        self._executor = None
+        self._job_lock = threading.Lock()
+        self._pending_job = None  # 아직 시작 안 한 최신 요청 (frame, future, kwargs, seq)
+        self._active_workers = 0
+        self._submit_seq = 0
+        self._latest_result = None
+        self._latest_result_seq = 0
+        self._overlay_cache = {}  # draw_analysis_result용 주석 오버레이
+        self.columnar = columnar
         self.use_demo_mode = use_demo_mode
         
         try:
@@ -77,12 +140,20 @@ class ScreenAnalyzer:
             logger.error(f"필수 라이브러리 누락: {e}")
             self.use_demo_mode = True
     
-    def analyze_frame(self, frame: np.ndarray) -> Dict[str, Any]:
+    def analyze_frame(self, frame: np.ndarray, use_cache: bool = True,
+                      roi: Tuple[int, int, int, int] = None) -> Dict[str, Any]:
         """
         프레임 분석
         
+        직전 분석 프레임과 시각적으로 같으면 (cache_tolerance 이내, cache_ttl 이내)
+        모델을 다시 실행하지 않고 이전 결과를 반환합니다 ('cache_hit': True).
+        incremental 모드에서는 바뀐 타일 영역만 다시 분석하고, 바뀌지 않은 요소는
+        이전 결과의 'id'를 그대로 유지합니다.
+        
         Args:
             frame: BGR 형식의 OpenCV 프레임
+            use_cache: False면 화면 변화와 무관하게 새로 분석
+            roi: (x1, y1, x2, y2)를 주면 그 영역만 분석 (analyze_regions 참고)
             
         Returns:
             {
@@ -95,7 +166,8 @@ class ScreenAnalyzer:
                         'center': (cx, cy),
                         'confidence': 0.95,
                         'description': '상세 설명',
-                        'interactable': True
+                        'interactable': True,
+                        'id': 0  # 분석 간 유지되는 요소 ID
                     },
                     ...
                 ],
@@ -110,26 +182,335 @@ class ScreenAnalyzer:
                 'analysis_time': 0.25,  # 분석 시간 (초)
             }
         """
+        if roi is not None:
+            return self.analyze_regions(frame, [roi])
+        
         start_time = time.time()
         
+        fingerprint = self._frame_fingerprint(frame)
+        if use_cache:
+            cached = self._lookup_cache(fingerprint)
+            if cached is not None:
+                cached['analysis_time'] = time.time() - start_time
+                return cached
+        
         try:
             # RGB로 변환
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             
-            if self.use_demo_mode or self.model is None:
-                # 데모 모드: 더미 분석 결과 반환
-                return self._get_dummy_analysis(rgb_frame)
-            
-            # 실제 OmniParser 분석 실행
-            result = self._analyze_with_omniparser(rgb_frame)
+            previous = self.analysis_cache
+            # TTL이 지난 결과는 병합 기준으로도 쓰지 않고 전체를 다시 분석
+            expired = (not previous or
+                       (self.cache_ttl > 0 and time.time() - previous['timestamp'] > self.cache_ttl))
+            if (self.incremental and not expired
+                    and previous['fingerprint'].shape == fingerprint.shape):
+                result = self._analyze_incremental(rgb_frame, fingerprint, previous)
+            else:
+                result = self._parse(rgb_frame)
+            self._assign_ids(result)
+            self._apply_columnar(result)
             
         except Exception as e:
             logger.error(f"프레임 분석 중 오류: {e}")
             result = {'success': False, 'error': str(e)}
         
+        result['analysis_time'] = time.time() - start_time
+        if result.get('success'):
+            self._store_cache(fingerprint, result)
+        return result
+    
+    @staticmethod
+    def _frame_fingerprint(frame: np.ndarray) -> np.ndarray:
+        """축소 그레이스케일 지문 (1080p 기준 4x4 픽셀 평균)"""
+        small = cv2.resize(frame, FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+    
+    @staticmethod
+    def _tile_diff(fp_a: np.ndarray, fp_b: np.ndarray) -> np.ndarray:
+        """
+        두 지문의 타일별 최대 절대 차이
+        
+        타일 평균을 쓰면 작은 변화(글자 입력 등)가 타일 면적에 묻히므로
+        타일 안에서 가장 크게 바뀐 지문 픽셀을 기준으로 합니다.
+        
+        Returns:
+            (rows, cols) 크기 배열
+        """
+        diff = cv2.absdiff(fp_a, fp_b).astype(np.float32)
+        h, w = diff.shape
+        t = FINGERPRINT_TILE
+        return diff[:h - h % t, :w - w % t].reshape(h // t, t, w // t, t).max(axis=(1, 3))
+    
+    def _lookup_cache(self, fingerprint: np.ndarray) -> Dict[str, Any] or None:
+        """화면이 바뀌지 않았으면 캐시된 결과의 사본 반환"""
+        cache = self.analysis_cache
+        if self.cache_ttl <= 0 or not cache:
+            return None
+        
+        if (time.time() - cache['timestamp'] > self.cache_ttl
+                or cache['fingerprint'].shape != fingerprint.shape
+                or self._tile_diff(cache['fingerprint'], fingerprint).max() > self.cache_tolerance):
+            self.cache_misses += 1
+            return None
+        
+        self.cache_hits += 1
+        result = dict(cache['result'])
+        result['cache_hit'] = True
+        return result
+    
+    def _store_cache(self, fingerprint: np.ndarray, result: Dict[str, Any]):
+        with self._state_lock:
+            self.analysis_cache = {
+                'fingerprint': fingerprint,
+                'result': result,
+                'timestamp': time.time(),
+            }
+    
+    def clear_cache(self):
+        """캐시된 분석 결과 삭제 (화면을 강제로 다시 분석할 때)"""
+        self.analysis_cache = {}
+    
+    def _parse(self, rgb_frame: np.ndarray) -> Dict[str, Any]:
+        """전체 프레임 분석 (데모 모드면 더미 결과)"""
+        if self.use_demo_mode or self.model is None:
+            # 데모 모드: 더미 분석 결과 반환
+            return self._get_dummy_analysis(rgb_frame)
+        # 실제 OmniParser 분석 실행
+        return self._analyze_with_omniparser(rgb_frame)
+    
+    def _analyze_region(self, rgb_frame: np.ndarray, region: Tuple[int, int, int, int]) -> Dict[str, Any]:
+        """
+        프레임의 한 영역만 분석
+        
+        Args:
+            rgb_frame: RGB 프레임
+            region: (x1, y1, x2, y2) 전체 프레임 좌표
+            
+        Returns:
+            전체 프레임 좌표로 변환된 분석 결과
+        """
+        x1, y1, x2, y2 = region
+        return self._offset_result(self._parse(rgb_frame[y1:y2, x1:x2]), x1, y1)
+    
+    @staticmethod
+    def _offset_result(result: Dict[str, Any], dx: int, dy: int) -> Dict[str, Any]:
+        """잘라낸 영역 기준 좌표를 전체 프레임 좌표로 이동"""
+        for element in result.get('elements', []):
+            bx1, by1, bx2, by2 = element['bbox']
+            element['bbox'] = (bx1 + dx, by1 + dy, bx2 + dx, by2 + dy)
+            cx, cy = element.get('center', (0, 0))
+            element['center'] = (cx + dx, cy + dy)
+        for block in result.get('text_blocks', []):
+            bx1, by1, bx2, by2 = block['bbox']
+            block['bbox'] = (bx1 + dx, by1 + dy, bx2 + dx, by2 + dy)
+        return result
+    
+    @staticmethod
+    def _clip_roi(roi: Tuple[int, int, int, int], frame_shape: Tuple[int, ...]) -> Tuple[int, int, int, int] or None:
+        """ROI를 프레임 범위로 자르기 (비어 있으면 None)"""
+        h, w = frame_shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in roi)
+        x1, x2 = max(0, min(x1, w)), max(0, min(x2, w))
+        y1, y2 = max(0, min(y1, h)), max(0, min(y2, h))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return x1, y1, x2, y2
+    
+    def analyze_regions(self, frame: np.ndarray, rois: List[Tuple[int, int, int, int]]) -> Dict[str, Any]:
+        """
+        여러 관심 영역(ROI)만 분석
+        
+        각 ROI만 잘라 탐지/OCR을 실행하므로 버튼 상태 확인처럼 화면 일부만
+        필요한 경우 전체 분석보다 훨씬 가볍습니다. 프레임 캐시는 사용하지 않습니다.
+        
+        Args:
+            frame: BGR 형식의 프레임
+            rois: [(x1, y1, x2, y2), ...] 전체 프레임 좌표
+            
+        Returns:
+            analyze_frame()과 같은 형식 (bbox/center는 전체 프레임 좌표),
+            'rois'에 실제로 분석한 (프레임 범위로 잘린) 영역 목록
+        """
+        start_time = time.time()
+        elements, text_blocks, analyzed = [], [], []
+        
+        try:
+            for roi in rois:
+                region = self._clip_roi(roi, frame.shape)
+                if region is None:
+                    continue
+                x1, y1, x2, y2 = region
+                # 잘라낸 영역만 색 변환
+                rgb_crop = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2RGB)
+                partial = self._offset_result(self._parse(rgb_crop), x1, y1)
+                if not partial.get('success'):
+                    partial['analysis_time'] = time.time() - start_time
+                    return partial
+                elements.extend(partial.get('elements', []))
+                text_blocks.extend(partial.get('text_blocks', []))
+                analyzed.append(region)
+            
+            result = {'success': True, 'elements': elements, 'text_blocks': text_blocks, 'rois': analyzed}
+            self._assign_ids(result)
+            self._apply_columnar(result)
+        except Exception as e:
+            logger.error(f"영역 분석 중 오류: {e}")
+            result = {'success': False, 'error': str(e)}
+        
         result['analysis_time'] = time.time() - start_time
         return result
     
+    def _dirty_regions(self, prev_fp: np.ndarray, fingerprint: np.ndarray,
+                       frame_shape: Tuple[int, ...]) -> Tuple[List[Tuple[int, int, int, int]], float]:
+        """
+        바뀐 타일을 이웃 타일까지 넓혀 묶은 사각형 목록
+        
+        Returns:
+            ([(x1, y1, x2, y2), ...] 전체 프레임 좌표, 바뀐 면적 비율)
+        """
+        changed = (self._tile_diff(prev_fp, fingerprint) > self.cache_tolerance).astype(np.uint8)
+        if not changed.any():
+            return [], 0.0
+        
+        # 타일 경계에 걸친 요소도 다시 잡히도록 한 타일씩 확장
+        dirty = cv2.dilate(changed, np.ones((3, 3), np.uint8))
+        rows, cols = dirty.shape
+        h, w = frame_shape[:2]
+        tile_w, tile_h = w / cols, h / rows
+        
+        count, _, stats, _ = cv2.connectedComponentsWithStats(dirty, connectivity=8)
+        regions = []
+        for tx, ty, tw, th, _ in stats[1:count]:
+            regions.append((int(tx * tile_w), int(ty * tile_h),
+                            min(w, int(round((tx + tw) * tile_w))), min(h, int(round((ty + th) * tile_h)))))
+        return regions, float(dirty.mean())
+    
+    def _analyze_incremental(self, rgb_frame: np.ndarray, fingerprint: np.ndarray,
+                             previous: Dict[str, Any]) -> Dict[str, Any]:
+        """바뀐 영역만 다시 분석해 이전 결과에 병합 (바뀐 영역이 없거나 너무 넓으면 전체 분석)"""
+        regions, dirty_ratio = self._dirty_regions(previous['fingerprint'], fingerprint, rgb_frame.shape)
+        if not regions or dirty_ratio > self.incremental_max_ratio:
+            return self._parse(rgb_frame)
+        
+        def untouched(item):
+            bx1, by1, bx2, by2 = item['bbox']
+            return all(bx2 <= x1 or bx1 >= x2 or by2 <= y1 or by1 >= y2
+                       for x1, y1, x2, y2 in regions)
+        
+        base = previous['result']
+        elements = [dict(e) for e in base.get('elements', []) if untouched(e)]
+        text_blocks = [dict(b) for b in base.get('text_blocks', []) if untouched(b)]
+        
+        for region in regions:
+            partial = self._analyze_region(rgb_frame, region)
+            if not partial.get('success'):
+                return self._parse(rgb_frame)
+            elements.extend(partial.get('elements', []))
+            text_blocks.extend(partial.get('text_blocks', []))
+        
+        return {
+            'success': True,
+            'elements': elements,
+            'text_blocks': text_blocks,
+            'dirty_regions': regions,
+        }
+    
+    def _apply_columnar(self, result: Dict[str, Any]):
+        """columnar 모드면 요소 목록을 ElementTable로 변환"""
+        if self.columnar and 'elements' in result:
+            result['elements'] = ElementTable.from_elements(result['elements'])
+    
+    def _assign_ids(self, result: Dict[str, Any]):
+        """ID가 없는 (새로 인식된) 요소에 ID 부여"""
+        with self._state_lock:
+            for element in result.get('elements', []):
+                if 'id' not in element:
+                    element['id'] = self._next_element_id
+                    self._next_element_id += 1
+    
+    def submit(self, frame: np.ndarray, callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+               **kwargs) -> Future:
+        """
+        프레임 분석을 백그라운드 워커에 요청 (즉시 반환)
+        
+        워커가 모두 바쁘면 요청은 대기 슬롯 하나에 보관되며, 그 사이 새 요청이
+        오면 이전 요청은 취소됩니다 (최신 프레임 우선). 따라서 밀린 프레임을
+        순서대로 분석하느라 결과가 늦어지는 일이 없습니다.
+        
+        Args:
+            frame: BGR 프레임 (분석 중 원본이 바뀌지 않도록 복사해서 사용)
+            callback: 분석 완료 시 결과 딕셔너리로 호출 (워커 스레드에서 실행)
+            **kwargs: analyze_frame()에 전달할 인자
+            
+        Returns:
+            analyze_frame() 결과로 완료되는 Future (대체되면 취소됨)
+        """
+        future = Future()
+        if callback is not None:
+            def _notify(f):
+                if not f.cancelled() and f.exception() is None:
+                    callback(f.result())
+            future.add_done_callback(_notify)
+        
+        with self._job_lock:
+            self._submit_seq += 1
+            if self._pending_job is not None:
+                self._pending_job[1].cancel()
+                self.dropped_frames += 1
+            self._pending_job = (frame.copy(), future, kwargs, self._submit_seq)
+            
+            if self._active_workers < self.max_workers:
+                self._active_workers += 1
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix="ScreenAnalyzer")
+                self._executor.submit(self._run_jobs)
+        return future
+    
+    def submit_async(self, frame: np.ndarray, **kwargs) -> "asyncio.Future":
+        """submit()의 asyncio 버전 (await 가능)"""
+        return asyncio.wrap_future(self.submit(frame, **kwargs))
+    
+    def _run_jobs(self):
+        """대기 슬롯이 빌 때까지 최신 요청을 꺼내 분석"""
+        while True:
+            with self._job_lock:
+                job, self._pending_job = self._pending_job, None
+                if job is None:
+                    self._active_workers -= 1
+                    return
+            
+            frame, future, kwargs, seq = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self.analyze_frame(frame, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            
+            with self._job_lock:
+                # 워커가 여럿이면 늦게 요청한 프레임이 먼저 끝날 수 있음
+                if seq > self._latest_result_seq:
+                    self._latest_result, self._latest_result_seq = result, seq
+            future.set_result(result)
+    
+    def get_latest_result(self) -> Optional[Dict[str, Any]]:
+        """submit()으로 완료된 가장 최근 프레임의 분석 결과 (없으면 None)"""
+        return self._latest_result
+    
+    def shutdown(self, wait: bool = True):
+        """분석 워커 종료 (대기 중인 요청은 취소)"""
+        with self._job_lock:
+            if self._pending_job is not None:
+                self._pending_job[1].cancel()
+                self._pending_job = None
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+    
     def _get_dummy_analysis(self, rgb_frame: np.ndarray) -> Dict[str, Any]:
         """
         데모 목적의 더미 분석 결과 반환
@@ -222,13 +603,18 @@ class ScreenAnalyzer:
             logger.error(f"OmniParser 분석 실패: {e}")
             return self._get_dummy_analysis(rgb_frame)
     
-    def draw_analysis_result(self, frame: np.ndarray, analysis: Dict[str, Any]) -> np.ndarray:
+    def draw_analysis_result(self, frame: np.ndarray, analysis: Dict[str, Any],
+                             region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
         """
         분석 결과를 프레임에 시각화
         
+        요소 주석은 분석 결과마다 한 번만 RGBA 오버레이로 그려 캐시하고,
+        매 프레임에서는 오버레이가 덮는 픽셀만 한 번에 알파 합성합니다.
+        
         Args:
             frame: BGR 형식의 프레임
             analysis: analyze_frame()의 결과
+            region: (x1, y1, x2, y2) 지정 시 이 영역과 겹치는 요소만 표시
             
         Returns:
             시각화된 프레임
@@ -237,8 +623,8 @@ class ScreenAnalyzer:
             return frame
         
         # UI 요소 그리기
-        for element in analysis.get('elements', []):
-            self._draw_element(frame, element)
+        overlay = self._get_overlay(analysis, frame.shape, region)
+        self._blend_overlay(frame, overlay)
         
         # 분석 시간 표시
         analysis_time = analysis.get('analysis_time', 0)
@@ -248,8 +634,60 @@ class ScreenAnalyzer:
         
         return frame
     
-    def _draw_element(self, frame: np.ndarray, element: Dict[str, Any]):
-        """UI 요소를 프레임에 그리기"""
+    def _get_overlay(self, analysis: Dict[str, Any], shape: Tuple[int, ...],
+                     region: Optional[Tuple[int, int, int, int]] = None) -> Dict[str, Any]:
+        """
+        분석 결과의 요소 주석 오버레이 (같은 요소 목록/영역이면 캐시 재사용)
+        
+        Returns:
+            {'index': 덮는 픽셀의 평탄화 인덱스,
+             'color': 알파가 곱해진 BGR 값 (N, 3),
+             'alpha': 알파 (N, 1)}
+        """
+        elements = analysis.get('elements', [])
+        cache = self._overlay_cache
+        if (cache and cache['elements'] is elements and cache['shape'] == shape[:2]
+                and cache['region'] == region):
+            return cache
+        
+        visible = elements
+        if region is not None:
+            visible = [elements[int(i)] for i in get_spatial_index(analysis).query_rect(region)]
+        
+        # 검은 캔버스에 그린 색은 LINE_AA 경계에서 커버리지만큼 감쇠됨 (premultiplied),
+        # 같은 도형을 마스크에 그려 커버리지(알파)를 얻음
+        canvas = np.zeros((shape[0], shape[1], 3), dtype=np.uint8)
+        mask = np.zeros((shape[0], shape[1]), dtype=np.uint8)
+        for element in visible:
+            self._draw_element(canvas, element, mask)
+        
+        alpha = mask.ravel()
+        index = np.flatnonzero(alpha)
+        cache = {
+            'elements': elements,
+            'shape': shape[:2],
+            'region': region,
+            'index': index,
+            'color': canvas.reshape(-1, 3)[index].astype(np.float32),
+            'alpha': (alpha[index].astype(np.float32) / 255.0)[:, None],
+        }
+        self._overlay_cache = cache
+        return cache
+    
+    @staticmethod
+    def _blend_overlay(frame: np.ndarray, overlay: Dict[str, Any]):
+        """오버레이가 덮는 픽셀에만 out = frame * (1 - a) + color 합성"""
+        index = overlay['index']
+        if index.size == 0:
+            return
+        flat = frame.reshape(-1, frame.shape[2])
+        blended = flat[index].astype(np.float32) * (1.0 - overlay['alpha']) + overlay['color']
+        flat[index] = (blended + 0.5).astype(np.uint8)
+        if not np.shares_memory(flat, frame):
+            frame[...] = flat.reshape(frame.shape)
+    
+    def _draw_element(self, frame: np.ndarray, element: Dict[str, Any], mask: Optional[np.ndarray] = None):
+        """UI 요소를 프레임에 그리기 (mask가 있으면 같은 도형을 커버리지 마스크에도 그림)"""
         bbox = element.get('bbox', (0, 0, 0, 0))
         label = element.get('label', '')
         element_type = element.get('type', 'unknown')
@@ -263,56 +701,120 @@ class ScreenAnalyzer:
             'image': (0, 255, 255),     # 시안
         }
         color = colors.get(element_type, (255, 0, 0))
+        targets = [(frame, color, (0, 0, 0))]
+        if mask is not None:
+            targets.append((mask, 255, 255))
         
-        # 바운딩 박스 그리기
-        cv2.rectangle(frame, (bbox[0], bbox[1]), (bbox[2], bbox[3]), 
-                     color, 2, cv2.LINE_AA)
-        
-        # 중심점 그리기
-        cx, cy = element.get('center', (0, 0))
-        cv2.circle(frame, (cx, cy), 5, color, -1)
+        for image, color, _ in targets:
+            # 바운딩 박스 그리기
+            cv2.rectangle(image, (bbox[0], bbox[1]), (bbox[2], bbox[3]), 
+                         color, 2, cv2.LINE_AA)
+            
+            # 중심점 그리기
+            cx, cy = element.get('center', (0, 0))
+            cv2.circle(image, (cx, cy), 5, color, -1)
         
         # 라벨 그리기
         if label:
             text = f"{label} ({confidence:.2f})"
             (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
             
-            # 텍스트 배경
-            cv2.rectangle(frame, (bbox[0], bbox[1] - 25), 
-                         (bbox[0] + tw + 5, bbox[1]), 
-                         color, -1)
-            
-            # 텍스트
-            cv2.putText(frame, text, (bbox[0] + 2, bbox[1] - 7),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+            for image, color, text_color in targets:
+                # 텍스트 배경
+                cv2.rectangle(image, (bbox[0], bbox[1] - 25), 
+                             (bbox[0] + tw + 5, bbox[1]), 
+                             color, -1)
+                
+                # 텍스트
+                cv2.putText(image, text, (bbox[0] + 2, bbox[1] - 7),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, text_color, 1, cv2.LINE_AA)
     
-    def get_clickable_elements(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def get_clickable_elements(self, analysis: Dict[str, Any]) -> Union[List[Dict[str, Any]], ElementTable]:
         """
         클릭 가능한 요소들만 추출
         
         Returns:
-            클릭 가능한 요소 목록 (버튼, 아이콘 등)
+            클릭 가능한 요소 목록 (버튼, 아이콘 등) - 분석 결과의 'elements'가
+            ElementTable(columnar 모드)이면 해당 요소만 담은 ElementTable
         """
         clickable_types = {'button', 'icon', 'link'}
         elements = analysis.get('elements', [])
         
+        if isinstance(elements, ElementTable):
+            return elements.take(elements.type_mask(clickable_types))
         return [e for e in elements if e.get('type') in clickable_types]
     
-    def find_element_by_text(self, analysis: Dict[str, Any], text: str) -> Dict[str, Any] or None:
+    def element_at(self, analysis: Dict[str, Any], x: int, y: int) -> Dict[str, Any] or None:
+        """
+        (x, y) 위치의 요소 (겹치면 가장 작은 요소)
+        
+        Args:
+            analysis: 분석 결과
+            x, y: 프레임 좌표
+            
+        Returns:
+            요소 또는 None
+        """
+        hits = get_spatial_index(analysis).query_point(x, y)
+        return analysis['elements'][int(hits[0])] if len(hits) else None
+    
+    def elements_in(self, analysis: Dict[str, Any], rect: Tuple[int, int, int, int],
+                    fully_inside: bool = True) -> List[Dict[str, Any]]:
+        """
+        영역 안의 요소 목록 (패널 안의 버튼 등)
+        
+        Args:
+            analysis: 분석 결과
+            rect: (x1, y1, x2, y2)
+            fully_inside: False면 영역과 겹치기만 해도 포함
+        """
+        mode = 'within' if fully_inside else 'intersects'
+        elements = analysis.get('elements', [])
+        return [elements[int(i)] for i in get_spatial_index(analysis).query_rect(rect, mode)]
+    
+    def nearest_element(self, analysis: Dict[str, Any], x: int, y: int,
+                        max_distance: float = np.inf) -> Dict[str, Any] or None:
+        """
+        (x, y)에 가장 가까운 요소 (bbox까지의 거리 기준, 안에 있으면 0)
+        
+        Args:
+            analysis: 분석 결과
+            x, y: 프레임 좌표
+            max_distance: 이보다 먼 요소는 무시 (픽셀)
+        """
+        nearest = get_spatial_index(analysis).nearest(x, y, 1, max_distance)
+        return analysis['elements'][nearest[0][0]] if nearest else None
+    
+    def find_element_by_text(self, analysis: Dict[str, Any], text: str, max_distance: int = 0,
+                             jamo: bool = False) -> Dict[str, Any] or None:
         """
         특정 텍스트를 포함하는 요소 찾기
         
         Args:
             analysis: 분석 결과
             text: 찾을 텍스트
+            max_distance: 허용 편집 거리 (OCR 오인식 대비, 0이면 정확한 부분 일치)
+            jamo: True면 한글 자모 단위 비교 ("신ㅊ", 초성 "ㅅㅊ" 등)
             
         Returns:
             찾은 요소 또는 None
         """
-        for element in analysis.get('elements', []):
-            if text.lower() in element.get('label', '').lower():
-                return element
-        return None
+        matches = get_text_index(analysis, 'elements').search(text, max_distance, jamo)
+        return analysis['elements'][matches[0]] if matches else None
+    
+    def find_text_blocks(self, analysis: Dict[str, Any], text: str, max_distance: int = 0,
+                         jamo: bool = False) -> List[Dict[str, Any]]:
+        """
+        특정 텍스트를 포함하는 OCR 텍스트 블록 목록 (가까운 일치 순)
+        
+        Args:
+            analysis: 분석 결과
+            text: 찾을 텍스트
+            max_distance: 허용 편집 거리
+            jamo: True면 한글 자모 단위 비교
+        """
+        blocks = analysis.get('text_blocks', [])
+        return [blocks[i] for i in get_text_index(analysis, 'text_blocks').search(text, max_distance, jamo)]
 
 
 # 사용 예제
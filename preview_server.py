@@ -0,0 +1,184 @@
+"""
+화면 미리보기 스트리밍 서버 (MJPEG / WebP)
+
+st.image로 매 프레임을 PNG 직렬화해 웹소켓으로 보내는 대신,
+프레임당 한 번만 JPEG/WebP로 인코딩해 multipart HTTP 스트림으로 내보냅니다.
+브라우저는 <img src=".../stream.mjpg">로 바로 재생합니다.
+"""
+import threading
+import time
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = "frame"
+
+ENCODINGS = {
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+class PreviewServer:
+    """최신 프레임을 MJPEG/WebP 스트림으로 제공하는 내장 HTTP 서버"""
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 8502, fmt: str = 'jpeg',
+                 quality: int = 80, max_width: int = 1280, max_fps: float = 30.0):
+        """
+        PreviewServer 초기화
+
+        Args:
+            host: 바인딩 주소
+            port: 포트
+            fmt: 'jpeg' 또는 'webp'
+            quality: 인코딩 품질 (1~100)
+            max_width: 이보다 넓은 프레임은 비율을 유지해 축소 (0이면 원본 크기)
+            max_fps: 클라이언트별 최대 전송 프레임 수
+        """
+        if fmt not in ENCODINGS:
+            raise ValueError(f"지원하지 않는 형식: {fmt} (jpeg/webp)")
+        self.host = host
+        self.port = port
+        self.fmt = fmt
+        self.quality = quality
+        self.max_width = max_width
+        self.max_fps = max_fps
+
+        self._frame = None
+        self._frame_seq = 0
+        self._encoded = (0, b"")  # (seq, bytes) - 프레임당 한 번만 인코딩
+        self._cond = threading.Condition()
+        self._encode_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def stream_path(self) -> str:
+        return "/stream.mjpg" if self.fmt == 'jpeg' else "/stream.webp"
+
+    def start(self):
+        """HTTP 서버 시작 (이미 실행 중이면 무시)"""
+        if self._server is not None:
+            return
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="PreviewServer", daemon=True)
+        self._thread.start()
+        logger.info(f"📺 미리보기 스트림: http://{self.host}:{self.port}{self.stream_path}")
+
+    def stop(self):
+        """HTTP 서버 종료"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def publish(self, frame: np.ndarray, channels: str = "RGB"):
+        """
+        새 프레임 등록 (인코딩은 시청 중인 클라이언트가 있을 때만 수행)
+
+        Args:
+            frame: 표시할 프레임 (등록 후 수정하지 말 것)
+            channels: "RGB" 또는 "BGR"
+        """
+        with self._cond:
+            self._frame = (frame, channels)
+            self._frame_seq += 1
+            self._cond.notify_all()
+
+    def _wait_frame(self, last_seq: int, timeout: float = 1.0) -> int:
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame_seq != last_seq, timeout)
+            return self._frame_seq
+
+    def _get_encoded(self) -> Tuple[int, bytes]:
+        """최신 프레임의 인코딩 결과 (여러 클라이언트가 공유)"""
+        with self._encode_lock:
+            with self._cond:
+                frame, seq = self._frame, self._frame_seq
+            if frame is None or self._encoded[0] == seq:
+                return self._encoded
+
+            image, channels = frame
+            if channels == "RGB":
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            h, w = image.shape[:2]
+            if self.max_width and w > self.max_width:
+                image = cv2.resize(image, (self.max_width, int(h * self.max_width / w)),
+                                   interpolation=cv2.INTER_AREA)
+
+            ext, _, quality_flag = ENCODINGS[self.fmt]
+            ok, buf = cv2.imencode(ext, image, [quality_flag, int(self.quality)])
+            if ok:
+                self._encoded = (seq, buf.tobytes())
+            return self._encoded
+
+    def _make_handler(self):
+        server = self
+        content_type = ENCODINGS[self.fmt][1]
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug("preview: " + format % args)
+
+            def do_GET(self):
+                if self.path.split("?")[0] == server.stream_path:
+                    self._stream()
+                elif self.path.split("?")[0] == "/snapshot":
+                    self._snapshot()
+                else:
+                    self.send_error(404)
+
+            def _snapshot(self):
+                seq, data = server._get_encoded()
+                if not data:
+                    self.send_error(503, "no frame yet")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+                self.send_header("Cache-Control", "no-store")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                min_interval = 1.0 / server.max_fps if server.max_fps > 0 else 0
+                last_seq = 0
+                try:
+                    while server._server is not None:
+                        if server._wait_frame(last_seq) == last_seq:
+                            continue
+                        last_seq, data = server._get_encoded()
+                        if not data:
+                            continue
+                        sent_at = time.time()
+                        self.wfile.write(
+                            f"--{BOUNDARY}\r\nContent-Type: {content_type}\r\n"
+                            f"Content-Length: {len(data)}\r\n\r\n".encode('ascii'))
+                        self.wfile.write(data)
+                        self.wfile.write(b"\r\n")
+                        self.wfile.flush()
+                        remaining = min_interval - (time.time() - sent_at)
+                        if remaining > 0:
+                            time.sleep(remaining)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+    def url(self, public_host: Optional[str] = None) -> str:
+        """브라우저에서 접근할 스트림 URL"""
+        host = public_host or ("localhost" if self.host in ("0.0.0.0", "") else self.host)
+        return f"http://{host}:{self.port}{self.stream_path}"
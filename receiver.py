@@ -1,105 +1,522 @@
-import socket
+import asyncio
 import pyautogui
+from PIL import Image
 import threading
-import sys
 import time
+import os
+import re
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import mss  # 네이티브 화면 캡처 (있으면 pyautogui보다 빠름)
+except ImportError:
+    mss = None
 
 HOST = '0.0.0.0' 
 PORT = 9999
 
-def handle_client(client_socket, addr):
-    print(f"🔗 [연결] {addr}", flush=True)
-    sys.stdout.flush()
+# --- 서버 설정 ---
+MAX_CONNECTIONS = 16        # 동시 연결 수 상한 (초과 시 ERR:busy 후 종료)
+QUEUE_SIZE = 1024           # 입력 실행 대기열 크기 (가득 차면 수신을 멈춰 백프레셔)
+MAX_LINE_BYTES = 64 * 1024  # 명령 한 줄 최대 크기
+MAX_WRITE_BUFFER = 16 * 1024 * 1024  # 응답을 읽지 않는 클라이언트의 송신 버퍼 상한
+
+# --- 마우스 이동 보간 설정 ---
+MOVE_DURATION = 0.3        # 목표 지점까지 이동 시간 (초), 0이면 즉시 이동
+MOVE_STEP_INTERVAL = 0.01  # 보간 스텝 간격 (초)
+MOVE_TWEEN = pyautogui.easeOutQuad
+
+# --- 워크플로우 설정 ---
+SCREENSHOT_DIR = 'screenshots'  # 워크플로우 SCREENSHOT 단계 저장 위치
+MAX_WAIT = 30.0                 # WAIT 단계 최대 대기 시간 (초)
+
+# --- 스크린샷 반환 설정 ---
+SCREENSHOT_FORMATS = ('jpeg', 'png', 'raw')
+SCREENSHOT_QUALITY = 85         # JPEG 기본 품질
+
+
+class MotionEngine:
+    """
+    전용 스레드에서 마우스를 움직이는 이동 엔진
+
+    MOVE 명령은 목표 좌표만 갱신하고 즉시 반환합니다. 이동 스레드는 항상
+    가장 최근 목표를 향해 보간하며, 이동 중 새 목표가 오면 현재 위치에서
+    새 목표로 방향을 바꿉니다. 따라서 밀린 MOVE는 실행되지 않고 버려지고,
+    마지막 명령 이후 최대 duration 안에 커서가 도착합니다.
+    """
+
+    def __init__(self, duration=MOVE_DURATION, step_interval=MOVE_STEP_INTERVAL, tween=MOVE_TWEEN):
+        self.duration = duration
+        self.step_interval = step_interval
+        self.tween = tween
+        self.dropped = 0  # 도착 전에 새 목표로 대체된 MOVE 수
+
+        self._target = None
+        self._moving = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="MotionEngine", daemon=True)
+        self._thread.start()
+
+    def move_to(self, x, y):
+        """목표 좌표 갱신 (비블로킹)"""
+        with self._cond:
+            if self._target is not None or self._moving:
+                self.dropped += 1
+            self._target = (x, y)
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """커서가 마지막 목표에 도착할 때까지 대기 (CLICK/TYPE 전에 호출)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._target is None and not self._moving, timeout)
+
+    def _take_target(self):
+        with self._cond:
+            target, self._target = self._target, None
+            return target
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._target is not None)
+                self._moving = True
+
+            target = self._take_target()
+            while target is not None:
+                target = self._move(target)
+
+            with self._cond:
+                self._moving = self._target is not None
+                self._cond.notify_all()
+
+    def _move(self, target):
+        """
+        target까지 보간 이동
+
+        Returns:
+            이동 중 들어온 새 목표 (없으면 None)
+        """
+        x, y = target
+        try:
+            if self.duration <= 0:
+                pyautogui.moveTo(x, y, _pause=False)
+                return self._take_target()
+
+            start_x, start_y = pyautogui.position()
+            start_time = time.time()
+            while True:
+                newer = self._take_target()
+                if newer is not None:
+                    return newer
+
+                progress = min(1.0, (time.time() - start_time) / self.duration)
+                ratio = self.tween(progress)
+                pyautogui.moveTo(int(start_x + (x - start_x) * ratio),
+                                 int(start_y + (y - start_y) * ratio), _pause=False)
+                if progress >= 1.0:
+                    return None
+                time.sleep(self.step_interval)
+        except Exception as e:
+            print(f"  ❌ 이동 에러: {e}", flush=True)
+            return None
+
+
+motion = None
+
+def split_workflow(data):
+    """
+    워크플로우 문자열을 단계별 명령으로 분리
     
-    # 연결 확인 응답
-    try:
-        client_socket.send(b"OK")
-    except:
-        pass
+    "WORKFLOW:" 접두사는 생략 가능하며, 단계는 ';'로 구분합니다.
+    TYPE 텍스트 안의 ';'는 '\\;'로 이스케이프합니다.
+    """
+    if data.startswith("WORKFLOW:"):
+        data = data[len("WORKFLOW:"):]
+    steps = re.split(r'(?<!\\);', data)
+    return [step.replace('\\;', ';').strip() for step in steps if step.strip()]
+
+
+def is_workflow(data):
+    """여러 단계가 ';'로 이어진 메시지인지 판별 (단일 TYPE의 텍스트는 제외)"""
+    if data.startswith("WORKFLOW:"):
+        return True
+    return not data.startswith("TYPE:") and len(split_workflow(data)) > 1
+
+
+def execute_workflow(data, emit=None):
+    """
+    워크플로우를 서버 측에서 순서대로 실행
+    
+    각 단계가 끝날 때마다 emit("STEP:<번호>:<OK|ERR>:<ms>:<명령>")으로 진행 상황을
+    보내고, 실패한 단계에서 중단합니다.
+    
+    Returns:
+        (성공 여부, 메시지)
+    """
+    steps = split_workflow(data)
+    print(f"  → 워크플로우 {len(steps)}단계", flush=True)
+    start = time.time()
+    
+    for i, step in enumerate(steps):
+        step_start = time.time()
+        ok, message = execute_command(step)
+        elapsed_ms = int((time.time() - step_start) * 1000)
+        if emit is not None:
+            emit(f"STEP:{i}:{'OK' if ok else 'ERR'}:{elapsed_ms}:{step}")
+        if not ok:
+            return False, f"step {i} failed ({step}): {message}"
+    
+    return True, f"{len(steps)} steps {int((time.time() - start) * 1000)}ms"
+
+
+_capture_local = threading.local()
+
+
+def grab_screen(region=None):
+    """
+    화면 캡처
+    
+    Args:
+        region: (x1, y1, x2, y2) 또는 None (주 모니터 전체)
+    
+    Returns:
+        RGB PIL Image
+    """
+    if mss is not None:
+        # mss 핸들은 스레드별로 만들어야 함
+        sct = getattr(_capture_local, 'sct', None)
+        if sct is None:
+            sct = _capture_local.sct = mss.mss()
+        monitor = sct.monitors[1]
+        if region is not None:
+            x1, y1, x2, y2 = region
+            monitor = {'left': monitor['left'] + x1, 'top': monitor['top'] + y1,
+                       'width': x2 - x1, 'height': y2 - y1}
+        shot = sct.grab(monitor)
+        return Image.frombytes('RGB', shot.size, shot.rgb)
+    
+    if region is not None:
+        x1, y1, x2, y2 = region
+        return pyautogui.screenshot(region=(x1, y1, x2 - x1, y2 - y1))
+    return pyautogui.screenshot()
+
+
+def encode_screenshot(image, fmt, quality=SCREENSHOT_QUALITY):
+    """스크린샷을 전송용 바이트로 인코딩 ('raw'는 RGB 픽셀 그대로)"""
+    if fmt == 'raw':
+        return image.tobytes()
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        image.save(buffer, format='JPEG', quality=quality)
+    else:
+        # 압축률보다 지연 시간 우선
+        image.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def capture_screenshot(args):
+    """
+    SCREENSHOT:<fmt>[:<x1>,<y1>,<x2>,<y2>][:<quality>] 처리
+    
+    Returns:
+        (True, {'header': '<fmt>:<w>:<h>', 'data': bytes})
+    """
+    parts = args.split(":")
+    fmt = parts[0].lower() or 'png'
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in SCREENSHOT_FORMATS:
+        return False, f"unsupported format: {fmt}"
+    
+    region = None
+    if len(parts) > 1 and parts[1]:
+        region = tuple(int(v) for v in parts[1].split(","))
+        if len(region) != 4 or region[2] <= region[0] or region[3] <= region[1]:
+            return False, f"invalid region: {parts[1]}"
+    quality = int(parts[2]) if len(parts) > 2 and parts[2] else SCREENSHOT_QUALITY
+    
+    image = grab_screen(region)
+    data = encode_screenshot(image, fmt, quality)
+    print(f"  → 스크린샷 전송: {fmt} {image.size[0]}x{image.size[1]} ({len(data)} bytes)", flush=True)
+    return True, {'header': f"{fmt}:{image.size[0]}:{image.size[1]}", 'data': data}
+
+
+def parse_point(text):
+    """'x,y' → (x, y)"""
+    x, y = text.split(",")
+    return int(x), int(y)
+
+
+def execute_command(data, emit=None):
+    """
+    명령 한 줄 실행
+    
+    Args:
+        data: 명령 문자열
+        emit: 중간 진행 상황을 보낼 함수 (워크플로우 단계별 상태)
+
+    Returns:
+        (성공 여부, 메시지)
+    """
+    if is_workflow(data):
+        return execute_workflow(data, emit)
+    
+    if data.startswith("MOVE:"):
+        try:
+            x, y = parse_point(data.split(":")[1])
+            print(f"  → 마우스 이동: ({x}, {y})", flush=True)
+            motion.move_to(x, y)
+            return True, "queued"
+        except Exception as e:
+            print(f"  ❌ 에러: {e}", flush=True)
+            return False, str(e)
+        
+    elif data == "CLICK" or data.startswith("CLICK:"):
+        try:
+            if data.startswith("CLICK:"):
+                # 좌표 클릭: 이동 후 도착하면 클릭
+                x, y = parse_point(data.split(":", 1)[1])
+                print(f"  → 클릭 실행: ({x}, {y})", flush=True)
+                motion.move_to(x, y)
+            else:
+                print(f"  → 클릭 실행", flush=True)
+            motion.wait_idle()
+            pyautogui.click()
+            print(f"  ✅ 완료", flush=True)
+            return True, ""
+        except Exception as e:
+            print(f"  ❌ 에러: {e}", flush=True)
+            return False, str(e)
+        
+    elif data.startswith("TYPE:"):
+        try:
+            text = data.split(":", 1)[1]
+            print(f"  → 텍스트 입력: {text}", flush=True)
+            motion.wait_idle()
+            pyautogui.write(text)
+            print(f"  ✅ 완료", flush=True)
+            return True, ""
+        except Exception as e:
+            print(f"  ❌ 에러: {e}", flush=True)
+            return False, str(e)
+    
+    elif data.startswith("WAIT:"):
+        try:
+            seconds = min(float(data.split(":", 1)[1]), MAX_WAIT)
+            print(f"  → 대기: {seconds}초", flush=True)
+            motion.wait_idle()
+            time.sleep(max(0.0, seconds))
+            return True, ""
+        except Exception as e:
+            print(f"  ❌ 에러: {e}", flush=True)
+            return False, str(e)
+    
+    elif data == "SCREENSHOT":
+        try:
+            motion.wait_idle()
+            os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+            path = os.path.join(SCREENSHOT_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{int(time.time() * 1000) % 1000:03d}.png")
+            pyautogui.screenshot(path)
+            print(f"  → 스크린샷 저장: {path}", flush=True)
+            return True, path
+        except Exception as e:
+            print(f"  ❌ 에러: {e}", flush=True)
+            return False, str(e)
+    
+    elif data.startswith("SCREENSHOT:"):
+        # 캡처 이미지를 같은 채널로 반환
+        try:
+            motion.wait_idle()
+            return capture_screenshot(data.split(":", 1)[1])
+        except Exception as e:
+            print(f"  ❌ 에러: {e}", flush=True)
+            return False, str(e)
+    else:
+        print(f"  ⚠️ 알 수 없는 명령: '{data}'", flush=True)
+        return False, f"unknown command: {data}"
+
+
+def unescape_line(text):
+    """클라이언트 escape_line의 역변환: '\\\\' → '\\', '\\n' → 줄바꿈, '\\r' → CR"""
+    return re.sub(r'\\([\\nr])', lambda m: {'n': '\n', 'r': '\r'}.get(m.group(1), '\\'), text)
+
+
+def parse_message(line):
+    """
+    "<seq>|<COMMAND>" 형식 분리
+
+    seq가 있는 메시지의 명령은 이스케이프를 풀어 여러 줄 TYPE 텍스트를 복원합니다.
+
+    Returns:
+        (seq 또는 None, 명령) - seq가 없으면 응답하지 않는 구버전 메시지
+    """
+    seq, sep, command = line.partition("|")
+    if sep and seq.isdigit():
+        return seq, unescape_line(command.strip())
+    return None, line.strip()
+
+
+class Outbox:
+    """
+    연결별 송신 대기열
+
+    응답은 대기열에 넣기만 하고, 연결마다 하나인 송신 태스크가 순서대로 쓰고
+    drain합니다. 스크린샷을 느리게 받는 클라이언트가 있어도 입력 워커와
+    다른 연결의 응답은 기다리지 않습니다.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._queue = asyncio.Queue()
+        self._queued_bytes = 0
+        self._task = asyncio.create_task(self._run())
+
+    def send_line(self, seq, body):
+        """응답 한 줄 전송 (seq가 없는 구버전 메시지는 응답하지 않음)"""
+        if seq is None:
+            return
+        self._put((f"{seq}|{body}".replace("\n", " ") + "\n").encode('utf-8'))
+
+    def send_data(self, seq, header, data):
+        """바이너리 응답 전송: "<seq>|DATA:<바이트 수>:<header>" 줄 뒤에 data"""
+        if seq is None:
+            return
+        self._put(f"{seq}|DATA:{len(data)}:{header}\n".encode('utf-8'), data)
+
+    def _put(self, *chunks):
+        if self.writer.is_closing():
+            return
+        size = sum(len(chunk) for chunk in chunks)
+        if self._queued_bytes + self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            # 응답을 읽지 않는 클라이언트가 메모리를 잡아먹지 않도록 끊음 (밀린 양 기준, 큰 응답 하나는 허용)
+            print(f"⚠️ 송신 버퍼 초과, 연결 종료", flush=True)
+            self.close()
+            return
+        self._queued_bytes += size
+        self._queue.put_nowait(chunks)
+
+    async def _run(self):
+        try:
+            while True:
+                chunks = await self._queue.get()
+                for chunk in chunks:
+                    self.writer.write(chunk)
+                self._queued_bytes -= sum(len(chunk) for chunk in chunks)
+                await self.writer.drain()
+        except ConnectionError:
+            self.writer.close()
+
+    def close(self):
+        """송신 태스크 중단 후 연결 종료"""
+        self._task.cancel()
+        self.writer.close()
+
+
+async def input_worker(queue):
+    """
+    입력 실행 루프
+    
+    모든 연결의 명령이 하나의 대기열을 거쳐 전용 스레드 하나에서 순서대로
+    실행되므로 pyautogui 호출이 서로 겹치지 않습니다. 응답은 연결별 Outbox에
+    넘기기만 하므로 전송 속도가 실행을 막지 않습니다.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="input")
     
     while True:
+        seq, command, outbox = await queue.get()
+        
+        def emit(body, seq=seq, outbox=outbox):
+            loop.call_soon_threadsafe(outbox.send_line, seq, body)
+        
         try:
-            # 수신 대기
-            data = client_socket.recv(1024).decode('utf-8').strip()
-            if not data:
+            ok, message = await loop.run_in_executor(executor, execute_command, command, emit)
+        except Exception as e:
+            ok, message = False, str(e)
+        
+        if isinstance(message, dict):
+            # 스크린샷 등 바이너리 결과
+            outbox.send_data(seq, message['header'], message['data'])
+        else:
+            status = "OK" if ok else "ERR"
+            outbox.send_line(seq, f"{status}:{message}" if message else status)
+        queue.task_done()
+
+
+async def handle_client(reader, writer, queue, connections):
+    addr = writer.get_extra_info('peername')
+    
+    if len(connections) >= MAX_CONNECTIONS:
+        print(f"⚠️ [거부] {addr} - 연결 수 초과 ({MAX_CONNECTIONS})", flush=True)
+        writer.write(b"ERR:busy\n")
+        writer.close()
+        return
+    
+    connections.add(writer)
+    print(f"\n🎯 [새 연결] {addr}", flush=True)
+    
+    # 연결 확인 응답
+    writer.write(b"OK\n")
+    outbox = Outbox(writer)
+    
+    try:
+        while True:
+            # 한 번에 여러 명령이 붙어 와도 줄 단위로 분리
+            line = await reader.readline()
+            if not line:
                 print(f"❌ [종료] {addr} - 데이터 없음", flush=True)
                 break
             
-            print(f"📨 [수신] {addr}: '{data}'", flush=True)
-            sys.stdout.flush()
-            
-            if data.startswith("MOVE:"):
-                try:
-                    coords = data.split(":")[1].split(",")
-                    x, y = int(coords[0]), int(coords[1])
-                    print(f"  → 마우스 이동: ({x}, {y})", flush=True)
-                    pyautogui.moveTo(x, y, duration=0.3)
-                    print(f"  ✅ 완료", flush=True)
-                except Exception as e:
-                    print(f"  ❌ 에러: {e}", flush=True)
-                
-            elif data == "CLICK":
-                try:
-                    print(f"  → 클릭 실행", flush=True)
-                    pyautogui.click()
-                    print(f"  ✅ 완료", flush=True)
-                except Exception as e:
-                    print(f"  ❌ 에러: {e}", flush=True)
-                
-            elif data.startswith("TYPE:"):
-                try:
-                    text = data.split(":", 1)[1]
-                    print(f"  → 텍스트 입력: {text}", flush=True)
-                    pyautogui.write(text)
-                    print(f"  ✅ 완료", flush=True)
-                except Exception as e:
-                    print(f"  ❌ 에러: {e}", flush=True)
-            else:
-                print(f"  ⚠️ 알 수 없는 명령: '{data}'", flush=True)
+            # 줄바꿈 없이 보내고 닫는 구버전 클라이언트도 readline이 마지막 조각을 돌려줌
+            data = line.decode('utf-8', errors='replace').strip()
+            if not data:
+                continue
             
-            sys.stdout.flush()
-
-        except socket.timeout:
-            continue
-        except Exception as e:
-            print(f"❌ [에러] {addr}: {e}", flush=True)
-            break
+            seq, command = parse_message(data)
+            print(f"📨 [수신] {addr}: '{command}'", flush=True)
+            # 대기열이 가득 차면 여기서 멈추고, TCP 수신 창이 차면서 송신 측이 느려짐
+            await queue.put((seq, command, outbox))
     
-    client_socket.close()
-    print(f"🔌 [종료] {addr} 연결 끊김", flush=True)
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        print(f"❌ [에러] {addr}: {e}", flush=True)
+    except ValueError:
+        print(f"❌ [에러] {addr}: 명령이 너무 깁니다 (>{MAX_LINE_BYTES} bytes)", flush=True)
+    finally:
+        connections.discard(writer)
+        outbox.close()
+        print(f"🔌 [종료] {addr} 연결 끊김", flush=True)
 
-def start_server():
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind((HOST, PORT))
-    server.listen(10)
+
+async def serve():
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    connections = set()
+    worker = asyncio.create_task(input_worker(queue))
+    
+    server = await asyncio.start_server(
+        lambda r, w: handle_client(r, w, queue, connections),
+        HOST, PORT, limit=MAX_LINE_BYTES, reuse_address=True)
     
     print(f"👂 ========================================", flush=True)
     print(f"👂 리시버 시작: {HOST}:{PORT}", flush=True)
     print(f"👂 ========================================", flush=True)
-    sys.stdout.flush()
+    
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker.cancel()
 
+
+def start_server():
+    global motion
+    if motion is None:
+        motion = MotionEngine()
+    
     try:
-        while True:
-            try:
-                client, addr = server.accept()
-                client.settimeout(5.0)
-                print(f"\n🎯 [새 연결] {addr}", flush=True)
-                sys.stdout.flush()
-                
-                client_thread = threading.Thread(
-                    target=handle_client, 
-                    args=(client, addr), 
-                    daemon=True
-                )
-                client_thread.start()
-            except Exception as e:
-                print(f"❌ [수신 에러] {e}", flush=True)
-                
+        asyncio.run(serve())
     except KeyboardInterrupt:
         print(f"\n⛔ 서버 종료", flush=True)
-    finally:
-        server.close()
 
 if __name__ == '__main__':
     start_server()
@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+import pytest
+
+from omniparser_analyzer import ScreenAnalyzer
+
+
+def make_screen(text, noise=0, seed=0):
+    """흰 배경 1080p 화면에 입력창 텍스트를 그린 BGR 프레임"""
+    frame = np.full((1080, 1920, 3), 245, dtype=np.uint8)
+    cv2.rectangle(frame, (600, 500), (1300, 560), (180, 180, 180), 2)
+    cv2.putText(frame, text, (615, 540), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (30, 30, 30), 2, cv2.LINE_AA)
+    if noise:
+        rng = np.random.default_rng(seed)
+        frame = np.clip(frame.astype(np.int16) + rng.integers(-noise, noise + 1, frame.shape), 0, 255).astype(np.uint8)
+    return frame
+
+
+@pytest.fixture
+def analyzer():
+    analyzer = ScreenAnalyzer(use_demo_mode=True, cache_ttl=60.0)
+    analyzer.use_demo_mode = True
+    yield analyzer
+    analyzer.shutdown()
+
+
+def test_unchanged_frame_hits_cache(analyzer):
+    analyzer.analyze_frame(make_screen("hello"))
+    assert analyzer.analyze_frame(make_screen("hello")).get('cache_hit') is True
+
+
+def test_capture_noise_hits_cache(analyzer):
+    analyzer.analyze_frame(make_screen("hello", noise=3, seed=1))
+    assert analyzer.analyze_frame(make_screen("hello", noise=3, seed=2)).get('cache_hit') is True
+
+
+@pytest.mark.parametrize("edited", ["hello!", "hellp", "hello wo"])
+def test_small_text_edit_invalidates_cache(analyzer, edited):
+    analyzer.analyze_frame(make_screen("hello"))
+    assert analyzer.analyze_frame(make_screen(edited)).get('cache_hit') is None
+
+
+def test_checkbox_toggle_invalidates_cache(analyzer):
+    frame = make_screen("hello")
+    cv2.rectangle(frame, (560, 515), (580, 535), (120, 120, 120), 1)
+    analyzer.analyze_frame(frame)
+    checked = frame.copy()
+    cv2.line(checked, (563, 525), (569, 531), (30, 30, 30), 2)
+    cv2.line(checked, (569, 531), (578, 518), (30, 30, 30), 2)
+    assert analyzer.analyze_frame(checked).get('cache_hit') is None
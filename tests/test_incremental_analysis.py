@@ -0,0 +1,50 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from omniparser_analyzer import ScreenAnalyzer
+
+
+def make_screen(dialog=False):
+    frame = np.full((1080, 1920, 3), 245, dtype=np.uint8)
+    cv2.putText(frame, "title", (100, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (30, 30, 30), 2)
+    if dialog:
+        cv2.rectangle(frame, (1400, 700), (1700, 900), (60, 60, 60), -1)
+    return frame
+
+
+@pytest.fixture
+def analyzer():
+    analyzer = ScreenAnalyzer(use_demo_mode=True, incremental=True, cache_ttl=0.05)
+    analyzer.use_demo_mode = True
+    parses = []
+    parse = analyzer._parse
+    analyzer._parse = lambda rgb: parses.append(rgb.shape) or parse(rgb)
+    analyzer.parses = parses
+    yield analyzer
+    analyzer.shutdown()
+
+
+def test_small_change_parses_only_dirty_region(analyzer):
+    analyzer.analyze_frame(make_screen())
+    result = analyzer.analyze_frame(make_screen(dialog=True), use_cache=False)
+    assert result['dirty_regions']
+    assert analyzer.parses[-1][:2] != (1080, 1920)
+
+
+def test_expired_unchanged_frame_is_reparsed(analyzer):
+    analyzer.analyze_frame(make_screen())
+    time.sleep(0.1)
+    result = analyzer.analyze_frame(make_screen())
+    assert result.get('cache_hit') is None
+    assert 'dirty_regions' not in result
+    assert analyzer.parses == [(1080, 1920, 3), (1080, 1920, 3)]
+
+
+def test_unchanged_frame_without_cache_is_reparsed(analyzer):
+    analyzer.analyze_frame(make_screen())
+    result = analyzer.analyze_frame(make_screen(), use_cache=False)
+    assert 'dirty_regions' not in result
+    assert len(analyzer.parses) == 2
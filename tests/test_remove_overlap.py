@@ -0,0 +1,130 @@
+"""remove_overlap_new (NumPy matrices) against the original double-loop implementation."""
+import random
+from typing import List
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+pytest.importorskip("supervision")
+
+from util.utils import remove_overlap_new
+
+
+def remove_overlap_reference(boxes, iou_threshold, ocr_bbox=None):
+    """remove_overlap_new before vectorization, kept verbatim as the reference."""
+    assert ocr_bbox is None or isinstance(ocr_bbox, List)
+
+    def box_area(box):
+        return (box[2] - box[0]) * (box[3] - box[1])
+
+    def intersection_area(box1, box2):
+        x1 = max(box1[0], box2[0])
+        y1 = max(box1[1], box2[1])
+        x2 = min(box1[2], box2[2])
+        y2 = min(box1[3], box2[3])
+        return max(0, x2 - x1) * max(0, y2 - y1)
+
+    def IoU(box1, box2):
+        intersection = intersection_area(box1, box2)
+        union = box_area(box1) + box_area(box2) - intersection + 1e-6
+        if box_area(box1) > 0 and box_area(box2) > 0:
+            ratio1 = intersection / box_area(box1)
+            ratio2 = intersection / box_area(box2)
+        else:
+            ratio1, ratio2 = 0, 0
+        return max(intersection / union, ratio1, ratio2)
+
+    def is_inside(box1, box2):
+        intersection = intersection_area(box1, box2)
+        ratio1 = intersection / box_area(box1)
+        return ratio1 > 0.80
+
+    filtered_boxes = []
+    if ocr_bbox:
+        filtered_boxes.extend(ocr_bbox)
+    for i, box1_elem in enumerate(boxes):
+        box1 = box1_elem['bbox']
+        is_valid_box = True
+        for j, box2_elem in enumerate(boxes):
+            # keep the smaller box
+            box2 = box2_elem['bbox']
+            if i != j and IoU(box1, box2) > iou_threshold and box_area(box1) > box_area(box2):
+                is_valid_box = False
+                break
+        if is_valid_box:
+            if ocr_bbox:
+                # keep yolo boxes + prioritize ocr label
+                box_added = False
+                ocr_labels = ''
+                for box3_elem in ocr_bbox:
+                    if not box_added:
+                        box3 = box3_elem['bbox']
+                        if is_inside(box3, box1):  # ocr inside icon
+                            try:
+                                # gather all ocr labels
+                                ocr_labels += box3_elem['content'] + ' '
+                                filtered_boxes.remove(box3_elem)
+                            except:
+                                continue
+                        elif is_inside(box1, box3):  # icon inside ocr, don't add this icon box
+                            box_added = True
+                            break
+                        else:
+                            continue
+                if not box_added:
+                    if ocr_labels:
+                        filtered_boxes.append({'type': 'icon', 'bbox': box1_elem['bbox'], 'interactivity': True, 'content': ocr_labels, 'source': 'box_yolo_content_ocr'})
+                    else:
+                        filtered_boxes.append({'type': 'icon', 'bbox': box1_elem['bbox'], 'interactivity': True, 'content': None, 'source': 'box_yolo_content_yolo'})
+            else:
+                filtered_boxes.append(box1)
+    return filtered_boxes
+
+
+def random_box(rng, grid=None):
+    if grid:
+        # integer cells: many equal areas, shared edges and exact containment
+        x1, y1 = rng.randrange(grid), rng.randrange(grid)
+        return [x1 / grid, y1 / grid, rng.randint(x1 + 1, grid) / grid, rng.randint(y1 + 1, grid) / grid]
+    x1, y1 = rng.random() * 0.9, rng.random() * 0.9
+    return [x1, y1, x1 + 0.005 + rng.random() * 0.2, y1 + 0.005 + rng.random() * 0.1]
+
+
+def make_case(rng, grid=None):
+    icons = [{'type': 'icon', 'bbox': random_box(rng, grid), 'interactivity': True, 'content': None}
+             for _ in range(rng.randint(0, 40))]
+    ocr = [{'type': 'text', 'bbox': random_box(rng, grid), 'interactivity': False,
+            'content': f"text{k}", 'source': 'box_ocr_content_ocr'}
+           for k in range(rng.randint(0, 15))]
+    # some ocr boxes inside icons and some icons inside ocr boxes
+    for icon in icons[:5]:
+        x1, y1, x2, y2 = icon['bbox']
+        ocr.append({'type': 'text', 'bbox': [x1 + (x2 - x1) * 0.05, y1 + (y2 - y1) * 0.05, x2 - (x2 - x1) * 0.05, y2 - (y2 - y1) * 0.05],
+                    'interactivity': False, 'content': 'inner', 'source': 'box_ocr_content_ocr'})
+    for text in ocr[:3]:
+        x1, y1, x2, y2 = text['bbox']
+        icons.append({'type': 'icon', 'bbox': [x1, y1, (x1 + x2) / 2, (y1 + y2) / 2], 'interactivity': True, 'content': None})
+    rng.shuffle(ocr)
+    return icons, ocr
+
+
+@pytest.mark.parametrize("grid", [None, 8, 20])
+@pytest.mark.parametrize("iou_threshold", [0.1, 0.7, 0.9])
+def test_matches_reference(grid, iou_threshold):
+    rng = random.Random(hash((grid, iou_threshold)) & 0xffff)
+    for _ in range(150):
+        icons, ocr = make_case(rng, grid)
+        assert remove_overlap_new(icons, iou_threshold) == remove_overlap_reference(icons, iou_threshold)
+        assert remove_overlap_new(icons, iou_threshold, ocr) == remove_overlap_reference(icons, iou_threshold, ocr)
+
+
+def test_ocr_text_merged_into_icon():
+    icon = {'type': 'icon', 'bbox': [0.1, 0.1, 0.3, 0.2], 'interactivity': True, 'content': None}
+    inner = [{'type': 'text', 'bbox': [0.12, 0.12, 0.18, 0.18], 'interactivity': False, 'content': 'Save', 'source': 'box_ocr_content_ocr'},
+             {'type': 'text', 'bbox': [0.2, 0.12, 0.28, 0.18], 'interactivity': False, 'content': 'As', 'source': 'box_ocr_content_ocr'}]
+    outside = {'type': 'text', 'bbox': [0.5, 0.5, 0.6, 0.6], 'interactivity': False, 'content': 'Other', 'source': 'box_ocr_content_ocr'}
+    result = remove_overlap_new([icon], 0.7, inner + [outside])
+    assert result == remove_overlap_reference([icon], 0.7, inner + [outside])
+    assert result == [outside, {'type': 'icon', 'bbox': icon['bbox'], 'interactivity': True,
+                                'content': 'Save As ', 'source': 'box_yolo_content_ocr'}]
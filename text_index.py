@@ -0,0 +1,249 @@
+"""
+분석 결과의 라벨/OCR 텍스트 검색용 역색인
+
+분석 결과마다 한 번만 만들어 두고, 같은 프레임에 대한 여러 번의 텍스트 조회를
+전체 요소 재탐색 없이 바이그램 색인으로 후보를 좁힌 뒤 검증합니다.
+오타 허용(편집 거리)과 한글 자모 단위 검색(예: "신ㅊ", 초성 "ㅅㅊ")을 지원합니다.
+"""
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 한글 음절 → 호환 자모 분해 테이블
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+JUNGSEONG = "ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ"
+JONGSEONG = ["", "ㄱ", "ㄲ", "ㄳ", "ㄴ", "ㄵ", "ㄶ", "ㄷ", "ㄹ", "ㄺ", "ㄻ", "ㄼ", "ㄽ", "ㄾ",
+             "ㄿ", "ㅀ", "ㅁ", "ㅂ", "ㅄ", "ㅅ", "ㅆ", "ㅇ", "ㅈ", "ㅊ", "ㅋ", "ㅌ", "ㅍ", "ㅎ"]
+HANGUL_BASE, HANGUL_LAST = 0xAC00, 0xD7A3
+
+
+def normalize(text: str) -> str:
+    """대소문자/유니코드 정규화 (NFC + 소문자)"""
+    return unicodedata.normalize('NFC', text).lower()
+
+
+def decompose_jamo(text: str) -> str:
+    """한글 음절을 초성/중성/종성 자모로 분해 ("신청" → "ㅅㅣㄴㅊㅓㅇ")"""
+    out = []
+    for ch in text:
+        code = ord(ch)
+        if HANGUL_BASE <= code <= HANGUL_LAST:
+            offset = code - HANGUL_BASE
+            out.append(CHOSEONG[offset // 588])
+            out.append(JUNGSEONG[(offset % 588) // 28])
+            out.append(JONGSEONG[offset % 28])
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def choseong(text: str) -> str:
+    """한글 음절을 초성으로 치환 ("유연근무" → "ㅇㅇㄱㅁ"), 그 외 문자는 유지"""
+    out = []
+    for ch in text:
+        code = ord(ch)
+        if HANGUL_BASE <= code <= HANGUL_LAST:
+            out.append(CHOSEONG[(code - HANGUL_BASE) // 588])
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def is_choseong_query(text: str) -> bool:
+    """초성만으로 이루어진 검색어인지 (공백 제외 2자 이상)"""
+    letters = text.replace(" ", "")
+    return len(letters) >= 2 and all(ch in CHOSEONG for ch in letters)
+
+
+def substring_distance(pattern: str, text: str, limit: int) -> int:
+    """
+    text의 임의 부분 문자열과 pattern 사이의 최소 편집 거리
+
+    limit을 넘는 것이 확정되면 limit + 1을 반환합니다.
+    """
+    if not pattern:
+        return 0
+    prev = [0] * (len(text) + 1)  # 부분 문자열이므로 시작 위치 비용 없음
+    for i, p in enumerate(pattern, 1):
+        cur = [i] + [0] * len(text)
+        for j, t in enumerate(text, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (p != t))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return min(prev)
+
+
+def _grams(text: str) -> List[str]:
+    """색인 단위: 바이그램 (한 글자 문자열은 유니그램)"""
+    if len(text) < 2:
+        return [text] if text else []
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+class TextIndex:
+    """
+    문자열 목록에 대한 바이그램 역색인
+
+    같은 문자열은 한 번만 색인하고, 결과는 원래 목록의 위치(인덱스)로 반환합니다.
+    변형(일반/자모/초성)별 색인은 처음 사용할 때 만들어집니다.
+    """
+
+    VARIANTS = {
+        'plain': lambda text: text,
+        'jamo': decompose_jamo,
+        'choseong': choseong,
+    }
+
+    def __init__(self, texts: Sequence[str], source: Any = None):
+        """
+        TextIndex 초기화
+
+        Args:
+            texts: 색인할 문자열 목록 (위치가 곧 문서 번호)
+            source: 색인 대상 원본 (분석 결과가 바뀌었는지 확인용)
+        """
+        self.source = source
+        self._keys: List[str] = []            # 정규화된 고유 문자열
+        self._docs: List[List[int]] = []      # 고유 문자열 → 원래 위치 목록
+        key_index: Dict[str, int] = {}
+        for position, text in enumerate(texts):
+            key = normalize(text or "")
+            slot = key_index.setdefault(key, len(self._keys))
+            if slot == len(self._keys):
+                self._keys.append(key)
+                self._docs.append([])
+            self._docs[slot].append(position)
+        self._variants: Dict[str, Tuple[List[str], Dict[str, List[int]]]] = {}
+        self._memo: Dict[Tuple[str, int, bool], List[Tuple[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(docs) for docs in self._docs)
+
+    def _variant(self, name: str) -> Tuple[List[str], Dict[str, List[int]]]:
+        """변형별 (변환된 문자열 목록, 그램 → 고유 문자열 번호 목록)"""
+        if name not in self._variants:
+            transform = self.VARIANTS[name]
+            strings = [transform(key) for key in self._keys]
+            postings: Dict[str, List[int]] = {}
+            for slot, string in enumerate(strings):
+                # 한 글자 검색어용 유니그램도 함께 색인
+                for gram in set(_grams(string)).union(string):
+                    postings.setdefault(gram, []).append(slot)
+            self._variants[name] = (strings, postings)
+        return self._variants[name]
+
+    def _candidates(self, query: str, postings: Dict[str, List[int]],
+                    max_distance: int) -> Optional[Iterable[int]]:
+        """검증할 고유 문자열 번호 (None이면 전체)"""
+        grams = _grams(query)
+        # 편집 1회는 바이그램을 최대 2개 깨뜨림 (q-gram 보조정리)
+        required = len(grams) - 2 * max_distance
+        if required <= 0:
+            return None
+
+        if max_distance == 0:
+            lists = sorted((postings.get(gram, []) for gram in set(grams)), key=len)
+            if not lists or not lists[0]:
+                return []
+            result = set(lists[0])
+            for other in lists[1:]:
+                result.intersection_update(other)
+                if not result:
+                    break
+            return result
+
+        counts: Dict[int, int] = {}
+        for gram in grams:
+            for slot in postings.get(gram, ()):
+                counts[slot] = counts.get(slot, 0) + 1
+        return [slot for slot, count in counts.items() if count >= required]
+
+    def search_scored(self, query: str, max_distance: int = 0,
+                      jamo: bool = False) -> List[Tuple[int, int]]:
+        """
+        query를 포함하는 문자열 검색
+
+        Args:
+            query: 검색어 (대소문자 무시, 부분 일치)
+            max_distance: 허용 편집 거리 (0이면 정확한 부분 일치)
+            jamo: True면 한글을 자모 단위로 비교 (편집 거리도 자모 단위),
+                초성만으로 된 검색어는 초성 문자열과 비교
+
+        Returns:
+            (편집 거리, 위치) 목록 - 거리, 위치 순 정렬
+        """
+        query = normalize(query)
+        memo_key = (query, max_distance, jamo)
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+
+        variant = 'plain'
+        if jamo:
+            if is_choseong_query(query):
+                variant = 'choseong'
+            else:
+                variant, query = 'jamo', decompose_jamo(query)
+        strings, postings = self._variant(variant)
+
+        candidates = self._candidates(query, postings, max_distance)
+        if candidates is None:
+            candidates = range(len(strings))
+
+        if max_distance == 0:
+            positions = []
+            for slot in candidates:
+                if query in strings[slot]:
+                    positions.extend(self._docs[slot])
+            positions.sort()
+            scored = [(0, position) for position in positions]
+        else:
+            scored = []
+            for slot in candidates:
+                string = strings[slot]
+                distance = 0 if query in string else substring_distance(query, string, max_distance)
+                if distance <= max_distance:
+                    scored.extend((distance, position) for position in self._docs[slot])
+            scored.sort()
+
+        # 같은 프레임에서 반복되는 조회 (의도별 라벨 등) 재사용
+        self._memo[memo_key] = scored
+        return scored
+
+    def search(self, query: str, max_distance: int = 0, jamo: bool = False) -> List[int]:
+        """query와 일치하는 위치 목록 (가까운 일치, 앞선 위치 순)"""
+        return [position for _, position in self.search_scored(query, max_distance, jamo)]
+
+    def search_any(self, queries: Iterable[str], max_distance: int = 0,
+                   jamo: bool = False) -> List[int]:
+        """queries 중 하나라도 일치하는 위치 목록 (위치별 최소 거리 기준 정렬)"""
+        best: Dict[int, int] = {}
+        for query in queries:
+            for distance, position in self.search_scored(query, max_distance, jamo):
+                if distance < best.get(position, max_distance + 1):
+                    best[position] = distance
+        return [position for position, _ in sorted(best.items(), key=lambda item: (item[1], item[0]))]
+
+
+def get_text_index(analysis: Dict[str, Any], kind: str = 'elements') -> TextIndex:
+    """
+    분석 결과의 텍스트 색인 (처음 호출 시 만들어 analysis['text_index']에 보관)
+
+    Args:
+        analysis: ScreenAnalyzer 분석 결과
+        kind: 'elements' (요소 라벨) 또는 'text_blocks' (OCR 텍스트)
+    """
+    source = analysis.get(kind, [])
+    indices = analysis.setdefault('text_index', {})
+    index = indices.get(kind)
+    if index is None or index.source is not source:
+        if kind == 'elements':
+            labels = getattr(source, 'labels', None)
+            if labels is not None:  # ElementTable: 라벨 테이블 재사용
+                texts = [labels[label_id] for label_id in source.label_ids]
+            else:
+                texts = [element.get('label', '') for element in source]
+        else:
+            texts = [block.get('text', '') for block in source]
+        index = TextIndex(texts, source=source)
+        indices[kind] = index
+    return index